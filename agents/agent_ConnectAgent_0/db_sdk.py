@@ -1,42 +1,158 @@
+import asyncio
 import aiosqlite
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
 
 
+# Statement shapes kept per Database; matches sqlite3's default cached_statements.
+_STMT_CACHE_SIZE = 128
+
 # --- Database Helper --------------------------------
 class Database:
     """
     Simple wrapper to manage a single aiosqlite connection per database file.
+
+    `pragmas` (e.g. {"journal_mode": "WAL", "synchronous": "NORMAL"}) are issued in order
+    each time the connection is opened, so they also apply after a close() and reconnect.
     """
-    def __init__(self, db_path: Union[Path, str]):
+    def __init__(self, db_path: Union[Path, str], pragmas: Optional[Dict[str, Any]] = None):
         self._db_path = Path(db_path)
         self._conn: Optional[aiosqlite.Connection] = None
+        self._pragmas = dict(pragmas or {})
+        # SQL text built by Model methods, keyed by statement shape (see Model._sql).
+        # Least recently used shapes are evicted beyond _STMT_CACHE_SIZE.
+        self._stmt_cache: "OrderedDict[Tuple[Any, ...], str]" = OrderedDict()
+        # >0 while a transaction() block is open; its owner's per-call commits are deferred
+        # to its end. The lock is held for the whole outermost block, and every statement or
+        # commit from any other task takes it too, so they never land inside the block.
+        self._tx_depth = 0
+        self._tx_owner: Optional["asyncio.Task[Any]"] = None
+        self._tx_lock = asyncio.Lock()
 
     async def connect(self) -> aiosqlite.Connection:
         if self._conn is None:
             self._conn = await aiosqlite.connect(str(self._db_path))
             self._conn.row_factory = aiosqlite.Row
+            for name, value in self._pragmas.items():
+                await self._conn.execute(f"PRAGMA {name}={value}")
         return self._conn
 
+    def _owns_tx(self) -> bool:
+        """True when the current task opened the transaction() block in progress."""
+        return self._tx_owner is asyncio.current_task()
+
     async def execute(self, sql: str, params: Tuple[Any, ...] = ()) -> aiosqlite.Cursor:
         db = await self.connect()
-        return await db.execute(sql, params)
+        if self._owns_tx():
+            return await db.execute(sql, params)
+        async with self._tx_lock:
+            return await db.execute(sql, params)
 
     async def executemany(self, sql: str, params_list: List[Tuple[Any, ...]]) -> aiosqlite.Cursor:
         db = await self.connect()
-        return await db.executemany(sql, params_list)
+        if self._owns_tx():
+            return await db.executemany(sql, params_list)
+        async with self._tx_lock:
+            return await db.executemany(sql, params_list)
 
     async def fetchall(self, sql: str, params: Tuple[Any, ...] = ()) -> List[aiosqlite.Row]:
-        cur = await self.execute(sql, params)
-        return await cur.fetchall()
+        db = await self.connect()
+        if self._owns_tx():
+            cur = await db.execute(sql, params)
+            return await cur.fetchall()
+        async with self._tx_lock:
+            cur = await db.execute(sql, params)
+            return await cur.fetchall()
 
     async def fetchone(self, sql: str, params: Tuple[Any, ...] = ()) -> Optional[aiosqlite.Row]:
-        cur = await self.execute(sql, params)
-        return await cur.fetchone()
+        db = await self.connect()
+        if self._owns_tx():
+            cur = await db.execute(sql, params)
+            return await cur.fetchone()
+        async with self._tx_lock:
+            cur = await db.execute(sql, params)
+            return await cur.fetchone()
 
     async def commit(self) -> None:
         db = await self.connect()
-        await db.commit()
+        if self._owns_tx():
+            # Inside our own transaction(): the block commits once on exit.
+            return
+        async with self._tx_lock:
+            await db.commit()
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator["Database"]:
+        """
+        Run several Model calls as one SQLite transaction (a single commit/fsync).
+
+        Opens with BEGIN IMMEDIATE, commits on normal exit and rolls back if the block
+        raises. Model methods called inside the block skip their own commit. Nested
+        blocks in the same task join the outermost one.
+
+        The block belongs to the task that opened it. Statements, commits and
+        transaction() blocks from other tasks on this Database wait until it ends, so
+        they are never committed or rolled back with it. Do not await another task
+        that uses this Database from inside the block: it would wait for the block.
+        """
+        if self._owns_tx():
+            self._tx_depth += 1
+            try:
+                yield self
+            finally:
+                self._tx_depth -= 1
+            return
+
+        async with self._tx_lock:
+            # Claim the block before the first await so no other task's statement slips in.
+            owner = asyncio.current_task()
+            self._tx_depth = 1
+            self._tx_owner = owner
+            try:
+                db = await self.connect()
+                if db.in_transaction:
+                    # Settle any implicit transaction left open by a raw execute().
+                    await db.commit()
+                await db.execute("BEGIN IMMEDIATE")
+            except BaseException:
+                self._tx_depth = 0
+                self._tx_owner = None
+                raise
+            try:
+                yield self
+            except BaseException:
+                # After abandon_transaction() the connection may carry another block.
+                if self._tx_owner is owner:
+                    await db.rollback()
+                raise
+            else:
+                await db.commit()
+            finally:
+                if self._tx_owner is owner:
+                    self._tx_depth = 0
+                    self._tx_owner = None
+
+    async def abandon_transaction(self) -> None:
+        """
+        Roll back a transaction() block whose task can no longer finish it because its
+        event loop was closed mid-block, and free this Database for the current loop.
+
+        While the owner's loop is still open, cancel and await the owner instead; this
+        raises RuntimeError in that case.
+        """
+        owner = self._tx_owner
+        if owner is None:
+            return
+        if not owner.get_loop().is_closed():
+            raise RuntimeError("transaction() owner is still running; cancel and await it instead")
+        db = await self.connect()
+        await db.rollback()
+        self._tx_depth = 0
+        self._tx_owner = None
+        # Waiters on the old lock belong to the closed loop and can never resume.
+        self._tx_lock = asyncio.Lock()
 
     async def close(self) -> None:
         if self._conn:
@@ -136,6 +252,72 @@ class ModelMeta(type):
 
 # --- Base Model --------------------------------------
 class Model(metaclass=ModelMeta):
+    @classmethod
+    def _sql(cls, db_conn: Database, key: Tuple[Any, ...], build: Callable[[], str]) -> str:
+        """
+        Return the SQL text for a statement shape, building it only on first use.
+        Values are always bound as parameters, so the text depends on the shape alone
+        (operation, column names, IN-list lengths) and sqlite3 can reuse its compiled form.
+        The cache keeps the _STMT_CACHE_SIZE most recently used shapes.
+        """
+        cache = db_conn._stmt_cache
+        sql = cache.get(key)
+        if sql is None:
+            sql = build()
+            cache[key] = sql
+            if len(cache) > _STMT_CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        return sql
+
+    @classmethod
+    def _where_shape(cls, where: Dict[str, Any]) -> Tuple[Tuple[str, Optional[int]], ...]:
+        return tuple(
+            (key, len(val) if isinstance(val, (list, tuple)) else None)
+            for key, val in where.items()
+        )
+
+    @classmethod
+    def _where_sql(cls, where: Dict[str, Any]) -> str:
+        invalid_fields = [
+            k.split('__', 1)[0] for k in where.keys()
+            if k.split('__', 1)[0] not in cls._fields
+        ]
+        if invalid_fields:
+            raise ValueError(f"Unknown fields for {cls.__name__}: {invalid_fields}")
+
+        conditions = []
+        for key, val in where.items():
+            if '__' in key:
+                fname, op = key.split('__', 1)
+                sql_op = _OPERATOR_MAP.get(op)
+                if sql_op in ('IN', 'NOT IN') and isinstance(val, (list, tuple)):
+                    placeholders = ",".join("?" for _ in val)
+                    conditions.append(f"{fname} {sql_op} ({placeholders})")
+                elif sql_op:
+                    conditions.append(f"{fname} {sql_op} ?")
+                else:
+                    # Fall back to literal key equality
+                    conditions.append(f"{key} = ?")
+            else:
+                conditions.append(f"{key} = ?")
+        return " WHERE " + " AND ".join(conditions)
+
+    @classmethod
+    def _where_params(cls, where: Dict[str, Any]) -> List[Any]:
+        params: List[Any] = []
+        for key, val in where.items():
+            if (
+                isinstance(val, (list, tuple))
+                and '__' in key
+                and _OPERATOR_MAP.get(key.split('__', 1)[1]) in ('IN', 'NOT IN')
+            ):
+                params.extend(val)
+            else:
+                params.append(val)
+        return params
+
     @classmethod
     async def insert(
         cls,
@@ -146,14 +328,42 @@ class Model(metaclass=ModelMeta):
         unknown_fields = [k for k in kwargs.keys() if k not in cls._fields]
         if unknown_fields:
             raise ValueError(f"Unknown fields for {cls.__name__}: {unknown_fields}")
-        keys, vals = zip(*[(k, v) for k, v in kwargs.items() if k in cls._fields])
-        cols = ", ".join(keys)
-        ph = ", ".join("?" for _ in keys)
-        sql = f"INSERT INTO {cls.__tablename__}({cols}) VALUES ({ph})"
-        cur = await db_conn.execute(sql, vals)
+        keys = tuple(kwargs.keys())
+        sql = cls._sql(db_conn, ("insert", cls, keys), lambda: (
+            f"INSERT INTO {cls.__tablename__}({', '.join(keys)}) "
+            f"VALUES ({', '.join('?' for _ in keys)})"
+        ))
+        cur = await db_conn.execute(sql, tuple(kwargs.values()))
         await db_conn.commit()
         return cur.lastrowid
 
+    @classmethod
+    async def insert_many(
+        cls,
+        db: Union[Database, Path, str],
+        rows: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Insert many rows at once. Rows with the same keys run as one `executemany`,
+        and the whole batch commits once.
+        """
+        db_conn = db if isinstance(db, Database) else Database(db)
+        groups: Dict[Tuple[str, ...], List[Tuple[Any, ...]]] = {}
+        for row in rows:
+            unknown_fields = [k for k in row.keys() if k not in cls._fields]
+            if unknown_fields:
+                raise ValueError(f"Unknown fields for {cls.__name__}: {unknown_fields}")
+            groups.setdefault(tuple(row.keys()), []).append(tuple(row.values()))
+
+        for keys, params_list in groups.items():
+            sql = cls._sql(db_conn, ("insert", cls, keys), lambda: (
+                f"INSERT INTO {cls.__tablename__}({', '.join(keys)}) "
+                f"VALUES ({', '.join('?' for _ in keys)})"
+            ))
+            await db_conn.executemany(sql, params_list)
+        if groups:
+            await db_conn.commit()
+
     @classmethod
     async def insert_or_ignore(
         cls,
@@ -162,12 +372,10 @@ class Model(metaclass=ModelMeta):
     ) -> Optional[int]:
         db_conn = db if isinstance(db, Database) else Database(db)
         keys, vals = zip(*[(k, v) for k, v in kwargs.items() if k in cls._fields])
-        cols = ", ".join(keys)
-        ph = ", ".join("?" for _ in keys)
-        sql = (
-            f"INSERT OR IGNORE INTO {cls.__tablename__}({cols}) "
-            f"VALUES ({ph})"
-        )
+        sql = cls._sql(db_conn, ("insert_or_ignore", cls, keys), lambda: (
+            f"INSERT OR IGNORE INTO {cls.__tablename__}({', '.join(keys)}) "
+            f"VALUES ({', '.join('?' for _ in keys)})"
+        ))
         cur = await db_conn.execute(sql, vals)
         await db_conn.commit()
         return cur.lastrowid or None
@@ -181,44 +389,28 @@ class Model(metaclass=ModelMeta):
         order_by: str = None
     ) -> List[Dict[str, Any]]:
         db_conn = db if isinstance(db, Database) else Database(db)
-        if fields:
-            invalid_fields = [f for f in fields if f not in cls._fields]
-            if invalid_fields:
-                raise ValueError(f"Unknown fields for {cls.__name__}: {invalid_fields}")
-        cols = fields or list(cls._fields.keys())
-        col_sql = ", ".join(cols)
-        sql = f"SELECT {col_sql} FROM {cls.__tablename__}"
-        params: List[Any] = []
-        if where:
-            invalid_fields = [k.split('__')[0] for k in where.keys() if k.split('__')[0] not in cls._fields]
-            if invalid_fields:
-                raise ValueError(f"Unknown fields for {cls.__name__}: {invalid_fields}")
-            conditions = []
-            for key, val in where.items():
-                if '__' in key:
-                    fname, op = key.split('__', 1)
-                    sql_op = _OPERATOR_MAP.get(op)
-                    if sql_op == 'IN' and isinstance(val, (list, tuple)):
-                        placeholders = ",".join("?" for _ in val)
-                        conditions.append(f"{fname} IN ({placeholders})")
-                        params.extend(val)
-                    elif sql_op == 'NOT IN' and isinstance(val, (list, tuple)):
-                        placeholders = ",".join("?" for _ in val)
-                        conditions.append(f"{fname} NOT IN ({placeholders})")
-                        params.extend(val)
-                    elif sql_op:
-                        conditions.append(f"{fname} {sql_op} ?")
-                        params.append(val)
-                    else:
-                        conditions.append(f"{key} = ?")
-                        params.append(val)
-                else:
-                    conditions.append(f"{key} = ?")
-                    params.append(val)
-            sql += " WHERE " + " AND ".join(conditions)
-        if order_by:
-            sql += f" ORDER BY {order_by}"
+        key = (
+            "find", cls,
+            tuple(fields) if fields else None,
+            cls._where_shape(where) if where else None,
+            order_by,
+        )
 
+        def build() -> str:
+            if fields:
+                invalid_fields = [f for f in fields if f not in cls._fields]
+                if invalid_fields:
+                    raise ValueError(f"Unknown fields for {cls.__name__}: {invalid_fields}")
+            cols = fields or list(cls._fields.keys())
+            sql = f"SELECT {', '.join(cols)} FROM {cls.__tablename__}"
+            if where:
+                sql += cls._where_sql(where)
+            if order_by:
+                sql += f" ORDER BY {order_by}"
+            return sql
+
+        sql = cls._sql(db_conn, key, build)
+        params = cls._where_params(where) if where else []
         rows = await db_conn.fetchall(sql, tuple(params))
         return [dict(row) for row in rows]
 
@@ -230,29 +422,62 @@ class Model(metaclass=ModelMeta):
         fields: Dict[str, Any]
     ) -> None:
         db_conn = db if isinstance(db, Database) else Database(db)
-        auto_updates = {k: 'CURRENT_TIMESTAMP' for k, f in cls._fields.items() if f.on_update}
-
-        set_parts = []
-        vals: List[Any] = []
-        for k, v in fields.items():
-            if k in cls._fields:
-                set_parts.append(f"{k} = ?")
-                vals.append(v)
-        for k, expr in auto_updates.items():
-            set_parts.append(f"{k} = {expr}")
-        
-        if not set_parts:
+        set_keys = tuple(k for k in fields.keys() if k in cls._fields)
+        sql = cls._update_sql(db_conn, set_keys, tuple(where.keys()))
+        if sql is None:
             # Nothing to do
             return
-        
-        set_sql = ", ".join(set_parts)
-        where_sql = " AND ".join(f"{k} = ?" for k in where.keys())
+
+        vals: List[Any] = [fields[k] for k in set_keys]
         vals.extend(where.values())
-        sql = f"UPDATE {cls.__tablename__} SET {set_sql} WHERE {where_sql}"
 
         await db_conn.execute(sql, tuple(vals))
         await db_conn.commit()
 
+    @classmethod
+    async def bulk_update(
+        cls,
+        db: Union[Database, Path, str],
+        updates: List[Tuple[Dict[str, Any], Dict[str, Any]]]
+    ) -> None:
+        """
+        Apply many `(where, fields)` updates at once. Updates sharing the same where keys
+        and field names run as one `executemany`, and the whole batch commits once.
+        """
+        db_conn = db if isinstance(db, Database) else Database(db)
+        groups: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], List[Tuple[Any, ...]]] = {}
+        for where, fields in updates:
+            set_keys = tuple(k for k in fields.keys() if k in cls._fields)
+            vals: List[Any] = [fields[k] for k in set_keys]
+            vals.extend(where.values())
+            groups.setdefault((set_keys, tuple(where.keys())), []).append(tuple(vals))
+
+        for (set_keys, where_keys), params_list in groups.items():
+            sql = cls._update_sql(db_conn, set_keys, where_keys)
+            if sql is not None:
+                await db_conn.executemany(sql, params_list)
+        if groups:
+            await db_conn.commit()
+
+    @classmethod
+    def _update_sql(
+        cls,
+        db_conn: Database,
+        set_keys: Tuple[str, ...],
+        where_keys: Tuple[str, ...]
+    ) -> Optional[str]:
+        auto_updates = [k for k, f in cls._fields.items() if f.on_update]
+        if not set_keys and not auto_updates:
+            return None
+
+        def build() -> str:
+            set_parts = [f"{k} = ?" for k in set_keys]
+            set_parts.extend(f"{k} = CURRENT_TIMESTAMP" for k in auto_updates)
+            where_sql = " AND ".join(f"{k} = ?" for k in where_keys)
+            return f"UPDATE {cls.__tablename__} SET {', '.join(set_parts)} WHERE {where_sql}"
+
+        return cls._sql(db_conn, ("update", cls, set_keys, where_keys), build)
+
     @classmethod
     async def delete(
         cls,
@@ -260,10 +485,12 @@ class Model(metaclass=ModelMeta):
         where: Dict[str, Any]
     ) -> None:
         db_conn = db if isinstance(db, Database) else Database(db)
-        where_sql = " AND ".join(f"{k} = ?" for k in where.keys())
-        vals = list(where.values())
-        sql = f"DELETE FROM {cls.__tablename__} WHERE {where_sql}"
-        await db_conn.execute(sql, tuple(vals))
+        where_keys = tuple(where.keys())
+        sql = cls._sql(db_conn, ("delete", cls, where_keys), lambda: (
+            f"DELETE FROM {cls.__tablename__} WHERE "
+            + " AND ".join(f"{k} = ?" for k in where_keys)
+        ))
+        await db_conn.execute(sql, tuple(where.values()))
         await db_conn.commit()
 
     @classmethod
@@ -297,43 +524,14 @@ class Model(metaclass=ModelMeta):
         Mirrors `find`'s operator-suffix behavior.
         """
         db_conn = db if isinstance(db, Database) else Database(db)
-        sql = f"SELECT 1 FROM {cls.__tablename__}"
-        params: List[Any] = []
 
-        if where:
-            # Validate field names (like `find`)
-            invalid_fields = [
-                k.split('__', 1)[0] for k in where.keys()
-                if k.split('__', 1)[0] not in cls._fields
-            ]
-            if invalid_fields:
-                raise ValueError(f"Unknown fields for {cls.__name__}: {invalid_fields}")
-
-            conditions = []
-            for key, val in where.items():
-                if '__' in key:
-                    fname, op = key.split('__', 1)
-                    sql_op = _OPERATOR_MAP.get(op)
-                    if sql_op == 'IN' and isinstance(val, (list, tuple)):
-                        placeholders = ",".join("?" for _ in val)
-                        conditions.append(f"{fname} IN ({placeholders})")
-                        params.extend(val)
-                    elif sql_op == 'NOT IN' and isinstance(val, (list, tuple)):
-                        placeholders = ",".join("?" for _ in val)
-                        conditions.append(f"{fname} NOT IN ({placeholders})")
-                        params.extend(val)
-                    elif sql_op:
-                        conditions.append(f"{fname} {sql_op} ?")
-                        params.append(val)
-                    else:
-                        # Fall back to literal key equality, matching `find`'s behavior
-                        conditions.append(f"{key} = ?")
-                        params.append(val)
-                else:
-                    conditions.append(f"{key} = ?")
-                    params.append(val)
-            sql += " WHERE " + " AND ".join(conditions)
+        def build() -> str:
+            sql = f"SELECT 1 FROM {cls.__tablename__}"
+            if where:
+                sql += cls._where_sql(where)
+            return sql + " LIMIT 1"
 
-        sql += " LIMIT 1"
+        sql = cls._sql(db_conn, ("exists", cls, cls._where_shape(where) if where else None), build)
+        params = cls._where_params(where) if where else []
         row = await db_conn.fetchone(sql, tuple(params))
         return row is not None
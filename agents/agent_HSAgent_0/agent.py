@@ -31,7 +31,8 @@
 #
 # CONCURRENCY MODEL (important!)
 #   - We split sending into two loops to avoid races:
-#       * tick_background_sender: periodic "maintenance" (register, finalize close/finish, reconnect).
+#       * tick_background_sender: periodic "maintenance" (finalize close/finish, reconnect).
+#       * register_sender: discovery broadcast (register), backing off while no new peers appear.
 #       * queued_sender: event-driven (on Trigger.ok/error) for the chatty steps (confirm/request/respond/conclude).
 #   - Receivers clear local_nonce immediately after accepting a peer nonce.
 #     The next my_nonce is minted in queued_sender, guaranteeing we never reuse a stale local_nonce.
@@ -58,9 +59,10 @@ from summoner.client import SummonerClient
 from summoner.protocol import Move, Stay, Node, Direction, Event
 import argparse
 import asyncio
+import logging
 import uuid
-import random
-from typing import Any, Optional
+import os
+from typing import Any, Awaitable, Optional
 from pathlib import Path
 
 
@@ -73,13 +75,41 @@ EXCHANGE_LIMIT = 3 # Only for initiator side
 INIT_FINAL_LIMIT = 3
 RESP_FINAL_LIMIT = 5 # Needs to wait for "conclude"
 
+# Background sender cadence (seconds). Ticks are scheduled against a deadline so
+# time spent in DB calls does not push every following tick back.
+SEND_TICK_INTERVAL = 1.0
+
+# Discovery broadcast cadence (seconds). Kept on its own ticker so peer discovery
+# does not ride on the protocol send tick. The interval starts at the minimum, grows
+# by REGISTER_BACKOFF after each broadcast up to the maximum, and drops back to the
+# minimum whenever a new peer shows up.
+REGISTER_INTERVAL_MIN = 1.0
+REGISTER_INTERVAL_MAX = 30.0
+REGISTER_BACKOFF = 1.5
+
+# RoleState write-behind (see role_flusher): dirty rows are written at most this
+# often (seconds), or as soon as this many rows are dirty.
+ROLE_FLUSH_INTERVAL = 0.01
+ROLE_FLUSH_MAX_ROWS = 100
+
+# Maps each random byte to an ASCII digit '1'..'9' (byte % 9, near-uniform).
+_DIGIT_TABLE = bytes(ord('1') + b % 9 for b in range(256))
+
 def generate_random_digits():
     # Nonces/refs are short tokens used for demonstration purposes.
-    return ''.join(random.choices('123456789', k=10))
+    # One urandom call + a C-level translate instead of a per-digit Python loop.
+    return os.urandom(10).translate(_DIGIT_TABLE).decode()
 
 # my agent ID (used in client name and to partition rows in the DB)
 my_id = str(uuid.uuid4())
 
+# The discovery broadcast never varies, so register_sender hands out this one dict.
+# It already carries 'from', so the send hook's tagging leaves it unchanged.
+REGISTER_PAYLOAD = {"to": None, "intent": "register", "from": my_id}
+
+# Constant log line for the send hook (my_id never changes after startup).
+SIGNATURE_LOG = f"[send][hook] tagging from={my_id[:5]}"
+
 
 
 """ =========================== DATABASE WIRING ============================= """
@@ -89,16 +119,94 @@ from db_models import RoleState, NonceEvent
 
 # Each agent instance uses its own on-disk DB. This partitions rows per agent run.
 db_path = Path(__file__).resolve().parent / f"HSAgent-{my_id}.db"
-db = Database(db_path)
+# Connection PRAGMAs for the write-heavy tick workload: WAL with synchronous=NORMAL
+# coalesces fsyncs to checkpoints, and hot pages stay in the cache / mmap.
+db = Database(db_path, pragmas={
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -64000,
+    "mmap_size": 30000000000,
+    "busy_timeout": 5000,
+})
+
+# Write-behind: after setup(), every DB operation runs on one writer task in FIFO
+# order, so queued writes (and their transactions) can never interleave or be
+# reordered. RoleState changes land in role_cache and NonceEvents in nonce_buffer
+# immediately; both reach the DB together through role_flusher. Reads that
+# must observe earlier writes (replay checks, inserts that return ids) go through db_call().
+db_queue: asyncio.Queue = asyncio.Queue()
+# Background tasks started on client.loop in __main__; shutdown() stops them.
+db_writer_task: Optional[asyncio.Task] = None
+role_flusher_task: Optional[asyncio.Task] = None
+
+async def db_writer() -> None:
+    """
+    Consume db_queue one operation at a time (scheduled on the client loop in __main__).
+    """
+    while True:
+        op, fut = await db_queue.get()
+        try:
+            result = await op
+        except Exception as e:
+            if fut is None:
+                client.logger.exception("[db_writer] queued write failed")
+            else:
+                fut.set_exception(e)
+        else:
+            if fut is not None:
+                fut.set_result(result)
+        finally:
+            db_queue.task_done()
+
+def db_enqueue(op: Awaitable) -> None:
+    """Queue a write behind the pending ones without waiting for it."""
+    db_queue.put_nowait((op, None))
+
+async def db_call(op: Awaitable) -> Any:
+    """Queue an operation and wait for its result; it runs after every write queued before it."""
+    fut = asyncio.get_running_loop().create_future()
+    db_queue.put_nowait((op, fut))
+    return await fut
+
+async def stop_task(task: Optional[asyncio.Task]) -> None:
+    """Cancel a background task started on this loop and wait until it has unwound."""
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        return
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+async def shutdown() -> None:
+    """
+    Flush dirty RoleState rows and buffered NonceEvents, let db_writer apply everything
+    queued, then stop it and close the database. Runs on client.loop (see __main__), so
+    cancelled tasks leave their transaction() blocks (rolling back) on their own loop.
+    """
+    await stop_task(role_flusher_task)
+    flush_dirty_rows()
+    if (db_writer_task is not None and not db_writer_task.done()
+            and db_writer_task.get_loop() is asyncio.get_running_loop()):
+        await db_queue.join()
+    await stop_task(db_writer_task)
+    # Only if the client closed its loop first: roll back a write_back the writer was
+    # left inside, then apply what is still queued here.
+    await db.abandon_transaction()
+    while not db_queue.empty():
+        op, _ = db_queue.get_nowait()
+        await op
+    await db.close()
 
 async def setup() -> None:
     """
     Create tables and the indexes we rely on for uniqueness and scanning.
 
     Index strategy:
-       - Uniqueness per conversation thread: (self_id, role, peer_id)
-       - Fast scans for the send loop: (self_id, role)
-       - Filtering and cleanup for nonce logs: (self_id, role, peer_id)
+       - The DB file is private to this agent run (see db_path), so self_id is the same on
+         every row; it is still stored, but left out of the indexes and WHERE clauses.
+       - Uniqueness per conversation thread: (role, peer_id); its (role) prefix also
+         serves role scans, so no separate scan index is kept
+       - Replay checks and cleanup for nonce logs: (role, peer_id, nonce); the
+         (role, peer_id) prefix drives the per-peer DELETE
 
     DATA MODEL SUMMARY
       RoleState:
@@ -115,16 +223,32 @@ async def setup() -> None:
     await RoleState.create_table(db)
     await NonceEvent.create_table(db)
 
-    await RoleState.create_index(db, "uq_role_peer", ["self_id", "role", "peer_id"], unique=True)
-    await RoleState.create_index(db, "ix_role_scan", ["self_id", "role"], unique=False)
-    await NonceEvent.create_index(db, "ix_nonce_triplet", ["self_id", "role", "peer_id"], unique=False)
+    await RoleState.create_index(db, "uq_role_peer", ["role", "peer_id"], unique=True)
+    await NonceEvent.create_index(db, "ix_nonce_lookup", ["role", "peer_id", "nonce"], unique=False)
+
+    # Warm the in-process RoleState cache (see ROLESTATE HELPERS).
+    for row in await RoleState.find(db, fields=ROLE_COLUMNS):
+        cache_role_row(row)
 
 
 
 """ ========================= CLIENT & FLOW SETUP =========================== """
 
+# Optional: run on uvloop (libuv) when it is installed. The policy must be set before
+# SummonerClient is constructed, since the client creates its event loop up front.
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 client = SummonerClient(name=f"HSAgent_0")
 
+# Python 3.12+: start tasks eagerly, so a handler that finishes without suspending
+# (e.g. the validation hook dropping a malformed payload) never goes through the scheduler.
+if hasattr(asyncio, "eager_task_factory"):
+    client.loop.set_task_factory(asyncio.eager_task_factory)
+
 # We activate a flow diagram to orchestrate the client's routes
 client_flow = client.flow().activate()
 client_flow.add_arrow_style(stem="-", brackets=("[","]"), separator=",", tip=">")
@@ -142,10 +266,79 @@ Trigger = client_flow.triggers()
 # resp_finalize   : responder returns its reference (finish)
 # init_finalize_close: initiator repeats close until counter exceeds INIT_FINAL_LIMIT
 
+# Preference order used by download() to pick one of the allowed states (see its docstring).
+ORDERED_STATES = {
+    "initiator": ("init_ready", "init_finalize_close", "init_finalize_propose", "init_exchange"),
+    "responder": ("resp_ready", "resp_finalize", "resp_confirm", "resp_exchange"),
+}
+# The same order paired with prebuilt Nodes, so download() does not construct them per call.
+ORDERED_STATE_NODES = {
+    role: tuple((s, Node(s)) for s in states) for role, states in ORDERED_STATES.items()
+}
+
 
 
 """ ======================= ROLESTATE HELPERS (UTILS) ======================= """
 
+# In-process copy of this agent's RoleState rows, keyed by (role, peer_id).
+# Loaded once in setup(); every RoleState write below goes to the DB (for crash
+# recovery) and is mirrored here, so the send drivers read rows without a query.
+role_cache: dict[tuple[str, str], dict] = {}
+
+# The same rows grouped by state, so each send driver only visits rows in the
+# states it has handlers for (idle rows are never walked by queued_sender).
+rows_by_state: dict[Optional[str], dict[tuple[str, str], dict]] = {}
+
+# Columns kept in role_cache rows: the ones the handlers and send drivers read
+# (timestamps and self_id are never consulted, so they are not loaded). Every cached
+# row carries all of them with SQLite-typed values, so the send handlers index directly.
+ROLE_COLUMNS = [
+    "id", "role", "peer_id", "state",
+    "local_nonce", "peer_nonce", "local_reference", "peer_reference",
+    "exchange_count", "finalize_retry_count", "peer_address",
+]
+# The mutable ones, written back whole when a dirty row is flushed.
+ROLE_WRITE_COLUMNS = ROLE_COLUMNS[3:]
+
+# Cached rows changed since the last flush, by primary key (see role_flusher).
+dirty_rows: dict[int, dict] = {}
+# NonceEvent rows logged since the last flush; written in the same transaction as dirty_rows.
+nonce_buffer: list[dict] = []
+flush_event = asyncio.Event()
+
+# Set whenever a RoleState row changes outside the send drivers (receive handlers,
+# download); queued_sender waits on it instead of sleeping a fixed interval.
+wake_event = asyncio.Event()
+
+def cache_role_row(row: dict) -> dict:
+    """Add a RoleState row to role_cache and rows_by_state; return it."""
+    key = (row["role"], row["peer_id"])
+    role_cache[key] = row
+    rows_by_state.setdefault(row["state"], {})[key] = row
+    return row
+
+def apply_role_fields(row: dict, fields: dict) -> None:
+    """Mirror written fields into a cached row, moving it in rows_by_state if its state changed."""
+    state = fields.get("state", row["state"])
+    if state != row["state"]:
+        key = (row["role"], row["peer_id"])
+        rows_by_state[row["state"]].pop(key, None)
+        rows_by_state.setdefault(state, {})[key] = row
+    row.update(fields)
+
+# Cache-miss path of ensure_role_state: create the row or, if it already exists, fill in a
+# NULL state, and read it back, all in one statement (UPSERT ... RETURNING, SQLite >= 3.35).
+ROLE_UPSERT_SQL = (
+    "INSERT INTO role_state(self_id, role, peer_id, state) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(role, peer_id) DO UPDATE SET state = COALESCE(role_state.state, excluded.state) "
+    f"RETURNING {', '.join(ROLE_COLUMNS)}"
+)
+
+async def upsert_role_row(self_id: str, role: str, peer_id: str, state: str) -> dict:
+    rows = await db.fetchall(ROLE_UPSERT_SQL, (self_id, role, peer_id, state))
+    await db.commit()
+    return dict(rows[0])
+
 async def ensure_role_state(self_id: str, role: str, peer_id: str, default_state: str) -> dict:
     """
     Ensure a RoleState row exists for (self_id, role, peer_id). If present with NULL state,
@@ -155,27 +348,96 @@ async def ensure_role_state(self_id: str, role: str, peer_id: str, default_state
       - Receive handlers often need to validate a peer's message against the last
         known local value (nonce/ref). Creating/normalizing here avoids None surprises.
     """
-    rows = await RoleState.find(db, where={"self_id": self_id, "role": role, "peer_id": peer_id})
-    if rows:
-        row = rows[0]
+    row = role_cache.get((role, peer_id))
+    if row is not None:
         if not row.get("state"):
-            await RoleState.update(db, where={"self_id": self_id, "role": role, "peer_id": peer_id}, fields={"state": default_state})
-            row["state"] = default_state
+            update_role_state(role, peer_id, fields={"state": default_state})
         return row
-    await RoleState.insert(db, self_id=self_id, role=role, peer_id=peer_id, state=default_state)
-    return {
-        "self_id": self_id, 
-        "role": role, 
-        "peer_id": peer_id, 
-        "state": default_state,
-        "local_nonce": None, 
-        "peer_nonce": None, 
-        "local_reference": None, 
-        "peer_reference": None,
-        "exchange_count": 0, 
-        "finalize_retry_count": 0, 
-        "peer_address": None
-    }
+    row = await db_call(upsert_role_row(self_id, role, peer_id, default_state))
+    # A first row for this (role, peer) means a new peer: announce ourselves promptly again.
+    reset_register_interval()
+    # Another handler may have cached (and since changed) the row while we awaited.
+    return role_cache.get((role, peer_id)) or cache_role_row(row)
+
+def peek_role_state(role: str, peer_id: str) -> Optional[dict]:
+    """
+    Cached RoleState row for (role, peer_id), or None. Handlers past the *_ready states use
+    this instead of ensure_role_state: the row was created on the way in, so a missing one
+    means the packet is not part of a conversation we know and is ignored.
+    """
+    return role_cache.get((role, peer_id))
+
+def mark_dirty(row: dict) -> None:
+    """Schedule a cached row for the next flush; flush early once ROLE_FLUSH_MAX_ROWS are pending."""
+    dirty_rows[row["id"]] = row
+    if len(dirty_rows) >= ROLE_FLUSH_MAX_ROWS:
+        flush_event.set()
+
+def update_role_state(role: str, peer_id: str, fields: dict) -> None:
+    """
+    Update this agent's RoleState row for (role, peer_id) in role_cache and mark it dirty;
+    role_flusher writes it back. A peer with no cached row has no DB row either, so
+    there is nothing to update.
+    """
+    row = role_cache.get((role, peer_id))
+    if row is None:
+        return
+    apply_role_fields(row, fields)
+    mark_dirty(row)
+    wake_event.set()
+
+def record_nonce(role: str, peer_id: str, flow: str, nonce: str) -> None:
+    """Log a NonceEvent for the next flush; flush early once ROLE_FLUSH_MAX_ROWS are pending."""
+    nonce_buffer.append({"self_id": my_id, "role": role, "peer_id": peer_id, "flow": flow, "nonce": nonce})
+    if len(nonce_buffer) >= ROLE_FLUSH_MAX_ROWS:
+        flush_event.set()
+
+async def nonce_received(role: str, peer_id: str, nonce: str) -> bool:
+    """Replay check: True if this nonce was already received from peer_id (flushed or still buffered)."""
+    for event in nonce_buffer:
+        if event["nonce"] == nonce and event["flow"] == "received" and event["role"] == role and event["peer_id"] == peer_id:
+            return True
+    return await db_call(NonceEvent.exists(db, {"role": role, "peer_id": peer_id, "flow": "received", "nonce": nonce}))
+
+def clear_nonces(role: str, peer_id: str) -> None:
+    """Drop the nonce log for (role, peer_id): buffered events and, in queue order, the flushed ones."""
+    nonce_buffer[:] = [e for e in nonce_buffer if e["role"] != role or e["peer_id"] != peer_id]
+    db_enqueue(NonceEvent.delete(db, where={"role": role, "peer_id": peer_id}))
+
+async def write_back(updates: list, nonce_events: list[dict]) -> None:
+    """One flush as a single transaction: the RoleState bulk_update, then the NonceEvent insert_many."""
+    async with db.transaction():
+        if updates:
+            await RoleState.bulk_update(db, updates)
+        if nonce_events:
+            await NonceEvent.insert_many(db, nonce_events)
+
+def flush_dirty_rows() -> None:
+    """
+    Queue one write_back of every dirty row's mutable columns (a bulk_update keyed on
+    primary key) and every buffered NonceEvent. Several changes to a row between flushes
+    cost one UPDATE.
+    """
+    if not dirty_rows and not nonce_buffer:
+        return
+    updates = [({"id": row_id}, {c: row[c] for c in ROLE_WRITE_COLUMNS}) for row_id, row in dirty_rows.items()]
+    nonce_events = nonce_buffer[:]
+    dirty_rows.clear()
+    nonce_buffer.clear()
+    db_enqueue(write_back(updates, nonce_events))
+
+async def role_flusher() -> None:
+    """
+    Write-behind loop for RoleState and NonceEvent (scheduled on the client loop in __main__):
+    flush every ROLE_FLUSH_INTERVAL, or as soon as ROLE_FLUSH_MAX_ROWS rows or events are pending.
+    """
+    while True:
+        try:
+            await asyncio.wait_for(flush_event.wait(), timeout=ROLE_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        flush_event.clear()
+        flush_dirty_rows()
 
 
 
@@ -208,13 +470,14 @@ async def upload(payload: dict) -> dict[str, str]:
         return {}
 
     # Peer-scoped advertisement, e.g. {"initiator:<peer>": "...", "responder:<peer>": "..."}
-    init_rows = await RoleState.find(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id}, fields=["state"])
-    resp_rows = await RoleState.find(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id}, fields=["state"])
+    # Read role_cache: with write-behind the DB may still be catching up.
+    init_row = role_cache.get(("initiator", peer_id))
+    resp_row = role_cache.get(("responder", peer_id))
 
-    init_state = init_rows[0]["state"] if init_rows and init_rows[0]["state"] else "init_ready"
-    resp_state = resp_rows[0]["state"] if resp_rows and resp_rows[0]["state"] else "resp_ready"
+    init_state = init_row["state"] if init_row and init_row["state"] else "init_ready"
+    resp_state = resp_row["state"] if resp_row and resp_row["state"] else "resp_ready"
 
-    client.logger.info(f"\033[92m[upload] peer={peer_id[:5]} | initiator={init_state} | responder={resp_state}\033[0m")
+    client.logger.info("\033[92m[upload] peer=%.5s | initiator=%s | responder=%s\033[0m", peer_id, init_state, resp_state)
     return {f"initiator:{peer_id}": init_state, f"responder:{peer_id}": resp_state}
 
 @client.download_states()
@@ -233,32 +496,31 @@ async def download(possible_states: dict[Optional[str], list[Node]]) -> None:
       - Responder:   resp_ready > resp_finalize > resp_confirm > resp_exchange
           (Prefer finishing/ack paths before re-confirming or ping-pong.)
     """
-    ordered_states = {
-        "initiator": ["init_ready", "init_finalize_close", "init_finalize_propose", "init_exchange"],
-        "responder": ["resp_ready", "resp_finalize", "resp_confirm", "resp_exchange"],
-    }
+    # Per-key log lines use lazy %-args behind one level check per call.
+    log_info = client.logger.isEnabledFor(logging.INFO)
 
     for key, role_states in possible_states.items():
         if key is None:
             continue
         if ":" not in str(key):
             # Ignore global per-role keys entirely
-            client.logger.info(f"[download] skipping non-scoped key '{key}'")
+            if log_info: client.logger.info("[download] skipping non-scoped key '%s'", key)
             continue
 
         role, peer_id = key.split(":", 1)
         if role not in ("initiator", "responder") or not peer_id:
             continue
 
-        client.logger.info(f"[download] possible states '{key}': {role_states}")
+        if log_info: client.logger.info("[download] possible states '%s': %s", key, role_states)
 
         # Choose first allowed state by our preference
-        target_state = next((s for s in ordered_states[role] if Node(s) in role_states), None)
+        allowed = set(role_states)
+        target_state = next((s for s, node in ORDERED_STATE_NODES[role] if node in allowed), None)
         if not target_state:
             continue
 
-        await RoleState.update(db, where={"self_id": my_id, "role": role, "peer_id": peer_id}, fields={"state": target_state})
-        client.logger.info(f"[download] '{role}' set state -> '{target_state}' for {peer_id[:5]}")
+        update_role_state(role, peer_id, fields={"state": target_state})
+        if log_info: client.logger.info("[download] '%s' set state -> '%s' for %.5s", role, target_state, peer_id)
 
 
 
@@ -278,13 +540,17 @@ async def validation(payload: Any) -> Optional[dict]:
     Returns payload to keep processing, or None to drop.
     """
     if isinstance(payload, str) and payload.startswith("Warning:"):
-        client.logger.warning(f"[server] {payload}")
-    if not("remote_addr" in payload and "content" in payload): return
-    content = payload["content"]
-    if not("from" in content and "to" in content and "intent" in content): return
-    if content["to"] is not None and content["to"] != my_id: return
-    if content["from"] is None: return
-    client.logger.info(f"receiving...\n\n\033[94m[recv][hook] {payload}\033[0m\n")
+        client.logger.warning("[server] %s", payload)
+    # One lookup per required key; a missing key or a non-dict payload/content drops the message.
+    try:
+        content = payload["content"]
+        if "remote_addr" not in payload or "intent" not in content: return
+        to, sender = content["to"], content["from"]
+    except (KeyError, TypeError):
+        return
+    if to is not None and to != my_id: return
+    if sender is None: return
+    client.logger.info("receiving...\n\n\033[94m[recv][hook] %s\033[0m\n", payload)
     return payload
 
 @client.hook(direction=Direction.SEND)
@@ -293,9 +559,9 @@ async def signature(payload: Any) -> Optional[dict]:
     Send hook: tag outbound messages with our agent id as 'from' and log.
     """
     if not isinstance(payload, dict): return
-    client.logger.info(f"[send][hook] tagging from={my_id[:5]}")
-    payload.update({"from": my_id})
-    client.logger.info(f"sending...\n\n\033[91m[send][hook] {payload}\033[0m\n")
+    client.logger.info(SIGNATURE_LOG)
+    payload["from"] = my_id
+    client.logger.info("sending...\n\n\033[91m[send][hook] %s\033[0m\n", payload)
     return payload
 
 
@@ -318,31 +584,29 @@ async def handle_register(payload: dict) -> Optional[Event]:
     """
     addr = payload["remote_addr"]
     content = payload["content"]
+    intent = content["intent"]
+    peer_id = content["from"]
 
-    if not(content["intent"] in ["register", "reconnect"]): return
+    if not(intent in ("register", "reconnect")): return
     client.logger.info("[resp_ready -> resp_confirm] intent OK")
 
-    peer_id = content["from"]
-
     # Ensure a row for this conversation thread; refresh peer address for convenience.
-    row, created = await RoleState.get_or_create(
-        db,
-        defaults={"state": "resp_ready", "peer_address": addr},
-        self_id=my_id, role="responder", peer_id=peer_id,
-    )
+    created = ("responder", peer_id) not in role_cache
+    row = await ensure_role_state(my_id, "responder", peer_id, "resp_ready")
     if created:
-        client.logger.info(f"[resp_ready -> resp_confirm] created role_state for peer={peer_id}")
-    else:
-        await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id}, fields={"peer_address": addr})
+        client.logger.info("[resp_ready -> resp_confirm] created role_state for peer=%s", peer_id)
+    update_role_state("responder", peer_id, fields={"peer_address": addr})
 
-    if content["intent"] == "register" and content["to"] is None and row.get("local_reference") is None:
-        client.logger.info(f"[resp_ready -> resp_confirm] REGISTER | peer_id={peer_id}")
+    local_ref = row.get("local_reference")
+    if intent == "register" and content["to"] is None and local_ref is None:
+        client.logger.info("[resp_ready -> resp_confirm] REGISTER | peer_id=%s", peer_id)
         return Move(Trigger.ok)
 
     # Reconnect must present our last local_reference as their 'your_ref'
-    if content["intent"] == "reconnect" and "your_ref" in content and content["your_ref"] == row.get("local_reference"):
-        await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id}, fields={"local_reference": None})
-        client.logger.info(f"[resp_ready -> resp_confirm] RECONNECT | peer_id={peer_id} under my_ref={row.get('local_reference')}")
+    your_ref = content.get("your_ref")
+    if intent == "reconnect" and your_ref is not None and your_ref == local_ref:
+        update_role_state("responder", peer_id, fields={"local_reference": None})
+        client.logger.info("[resp_ready -> resp_confirm] RECONNECT | peer_id=%s under my_ref=%s", peer_id, local_ref)
         return Move(Trigger.ok)
 
 @client.receive(route="resp_confirm --> resp_exchange")
@@ -359,38 +623,86 @@ async def handle_request(payload: dict) -> Optional[Event]:
     addr = payload["remote_addr"]
     content = payload["content"]
     peer_id = content["from"]
+    your_nonce = content.get("your_nonce")
+    my_nonce = content.get("my_nonce")
 
     if not(content["intent"] == "request" and content["to"] is not None): return Stay(Trigger.ignore)
     client.logger.info("[resp_confirm -> resp_exchange] intent OK")
 
-    if not("your_nonce" in content and "my_nonce" in content): return Stay(Trigger.ignore)
+    if your_nonce is None or my_nonce is None: return Stay(Trigger.ignore)
     client.logger.info("[resp_confirm -> resp_exchange] validation OK")
 
-    row = await ensure_role_state(my_id, "responder", peer_id, "resp_ready")
-    client.logger.info(f"[resp_confirm -> resp_exchange] check local_nonce={row.get('local_nonce')!r} ?= your_nonce={content['your_nonce']!r}")
-    if row.get("local_nonce") != content["your_nonce"]:
+    row = peek_role_state("responder", peer_id)
+    if row is None: return Stay(Trigger.ignore)
+    local_nonce = row.get("local_nonce")
+    client.logger.info("[resp_confirm -> resp_exchange] check local_nonce=%r ?= your_nonce=%r", local_nonce, your_nonce)
+    if local_nonce != your_nonce:
         return Stay(Trigger.ignore)
     
     # Replay guard: inbound my_nonce must be new for this (self,role,peer)
-    seen_my_nonce = await NonceEvent.exists(db, {"self_id": my_id, "role": "responder", "peer_id": peer_id, "flow": "received", "nonce": content["my_nonce"]})
+    seen_my_nonce = await nonce_received("responder", peer_id, my_nonce)
     if seen_my_nonce:
-        client.logger.info(f"[resp_confirm -> resp_exchange] received my_nonce={content['my_nonce']!r} previously used")
+        client.logger.info("[resp_confirm -> resp_exchange] received my_nonce=%r previously used", my_nonce)
         return Stay(Trigger.ignore)
 
     # Accept their my_nonce, reset our local_nonce (we'll generate on send), set exchange_count=1
-    await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id},
+    update_role_state("responder", peer_id,
         fields={
-            "peer_nonce": content["my_nonce"], 
+            "peer_nonce": my_nonce, 
             "local_nonce": None,
             "peer_reference": None,
             "local_reference": None,
             "exchange_count": 1, 
             "peer_address": addr
         })
-    await NonceEvent.insert(db, self_id=my_id, role="responder", peer_id=peer_id, flow="received", nonce=content["my_nonce"])
+    record_nonce("responder", peer_id, "received", my_nonce)
     client.logger.info("[resp_confirm -> resp_exchange] FIRST REQUEST")
     return Move(Trigger.ok)
 
+async def _do_conclude(row: dict, value: str, addr: Any, peer_id: str) -> Optional[Event]:
+    """
+    conclude branch of handle_request_or_conclude: capture the initiator's reference
+    (value = my_ref), reset exchange_count and move to resp_finalize.
+    """
+    update_role_state("responder", peer_id,
+        fields={
+            "peer_reference": value, 
+            "exchange_count": 0, 
+            "peer_address": addr
+        })
+    client.logger.info("[resp_exchange -> resp_finalize] REQUEST TO CONCLUDE")
+    return Move(Trigger.ok)
+
+async def _do_request(row: dict, value: str, addr: Any, peer_id: str) -> Optional[Event]:
+    """
+    request branch of handle_request_or_conclude: replay check, then store the peer's
+    my_nonce (value), clear ours and bump exchange_count (we stay in resp_exchange).
+    """
+    # Replay guard: inbound my_nonce must be new for this (self,role,peer)
+    seen_my_nonce = await nonce_received("responder", peer_id, value)
+    if seen_my_nonce:
+        client.logger.info("[resp_exchange -> resp_finalize] received my_nonce=%r previously used", value)
+        return Stay(Trigger.ignore)
+
+    # Request: continue ping-pong, bump exchange_count, store their my_nonce, and clear ours
+    new_count = int(row.get("exchange_count", 0)) + 1
+    update_role_state("responder", peer_id,
+        fields={
+            "peer_nonce": value, 
+            "local_nonce": None, 
+            "exchange_count": new_count, 
+            "peer_address": addr
+        })
+    record_nonce("responder", peer_id, "received", value)
+    client.logger.info("[resp_exchange -> resp_finalize] REQUEST RECEIVED #%s", new_count)
+    return Stay(Trigger.ok)
+
+# intent -> (required payload field, branch handler) for handle_request_or_conclude
+INTENT_HANDLERS = {
+    "request": ("my_nonce", _do_request),
+    "conclude": ("my_ref", _do_conclude),
+}
+
 @client.receive(route="resp_exchange --> resp_finalize")
 async def handle_request_or_conclude(payload: dict) -> Optional[Event]:
     """
@@ -398,53 +710,33 @@ async def handle_request_or_conclude(payload: dict) -> Optional[Event]:
       - request  : {your_nonce, my_nonce} with echo + replay checks. On success:
                    store peer_nonce, clear local_nonce, bump exchange_count, log received.
       - conclude : {your_nonce, my_ref}. On success: capture peer_reference and move to resp_finalize.
+
+    Shared checks (addressing, field presence, echo) run once here; the intent-specific
+    work is dispatched through INTENT_HANDLERS.
     """
     addr = payload["remote_addr"]
     content = payload["content"]
     peer_id = content["from"]
+    your_nonce = content.get("your_nonce")
 
-    if not(content["intent"] in ["request", "conclude"] and content["to"] is not None): return Stay(Trigger.ignore)
+    entry = INTENT_HANDLERS.get(content["intent"])
+    if not(entry is not None and content["to"] is not None): return Stay(Trigger.ignore)
     client.logger.info("[resp_exchange -> resp_finalize] intent OK")
 
-    if not("your_nonce" in content and (("my_nonce" in content and content["intent"] == "request") or
-                                        ("my_ref" in content and content["intent"] == "conclude"))):
+    required_field, handler = entry
+    value = content.get(required_field)
+    if your_nonce is None or value is None:
         return Stay(Trigger.ignore)
     client.logger.info("[resp_exchange -> resp_finalize] validation OK")
 
-    row = await ensure_role_state(my_id, "responder", peer_id, "resp_ready")
-    client.logger.info(f"[resp_exchange -> resp_finalize] check local_nonce={row.get('local_nonce')!r} ?= your_nonce={content['your_nonce']!r}")
-    if row.get("local_nonce") != content["your_nonce"]:
-        return Stay(Trigger.ignore)
-    
-    if content["intent"] == "conclude":
-        # Capture initiator's reference; reset exchange_count; move to resp_finalize
-        await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id},
-            fields={
-                "peer_reference": content["my_ref"], 
-                "exchange_count": 0, 
-                "peer_address": addr
-            })
-        client.logger.info("[resp_exchange -> resp_finalize] REQUEST TO CONCLUDE")
-        return Move(Trigger.ok)
-    
-    # Replay guard: inbound my_nonce must be new for this (self,role,peer)
-    seen_my_nonce = await NonceEvent.exists(db, {"self_id": my_id, "role": "responder", "peer_id": peer_id, "flow": "received", "nonce": content["my_nonce"]})
-    if seen_my_nonce:
-        client.logger.info(f"[resp_exchange -> resp_finalize] received my_nonce={content['my_nonce']!r} previously used")
+    row = peek_role_state("responder", peer_id)
+    if row is None: return Stay(Trigger.ignore)
+    local_nonce = row.get("local_nonce")
+    client.logger.info("[resp_exchange -> resp_finalize] check local_nonce=%r ?= your_nonce=%r", local_nonce, your_nonce)
+    if local_nonce != your_nonce:
         return Stay(Trigger.ignore)
 
-    # Request: continue ping-pong, bump exchange_count, store their my_nonce, and clear ours
-    new_count = int(row.get("exchange_count", 0)) + 1
-    await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id},
-        fields={
-            "peer_nonce": content["my_nonce"], 
-            "local_nonce": None, 
-            "exchange_count": new_count, 
-            "peer_address": addr
-        })
-    await NonceEvent.insert(db, self_id=my_id, role="responder", peer_id=peer_id, flow="received", nonce=content["my_nonce"])
-    client.logger.info(f"[resp_exchange -> resp_finalize] REQUEST RECEIVED #{new_count}")
-    return Stay(Trigger.ok)
+    return await handler(row, value, addr, peer_id)
 
 @client.receive(route="resp_finalize --> resp_ready")
 async def handle_close(payload: dict) -> Optional[Event]:
@@ -468,18 +760,23 @@ async def handle_close(payload: dict) -> Optional[Event]:
     if not(content["to"] is not None): return Stay(Trigger.ignore)
     client.logger.info("[resp_finalize -> resp_ready] intent OK")
 
-    row = await ensure_role_state(my_id, "responder", peer_id, "resp_ready")
+    row = peek_role_state("responder", peer_id)
+    if row is None: return Stay(Trigger.ignore)
+    retry_count = int(row.get("finalize_retry_count", 0))
     if content["intent"] == "close":
-        if not("your_ref" in content and "my_ref" in content): return Stay(Trigger.ignore)
+        your_ref = content.get("your_ref")
+        my_ref = content.get("my_ref")
+        if your_ref is None or my_ref is None: return Stay(Trigger.ignore)
         client.logger.info("[resp_finalize -> resp_ready] validation OK")
 
-        client.logger.info(f"[resp_finalize -> resp_ready] check local_reference={row.get('local_reference')!r} ?= your_ref={content['your_ref']!r}")
-        if row.get("local_reference") != content["your_ref"]:
+        local_ref = row.get("local_reference")
+        client.logger.info("[resp_finalize -> resp_ready] check local_reference=%r ?= your_ref=%r", local_ref, your_ref)
+        if local_ref != your_ref:
             return Stay(Trigger.ignore)
 
-        await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id},
+        update_role_state("responder", peer_id,
             fields={
-                "peer_reference": content["my_ref"],
+                "peer_reference": my_ref,
                 "local_nonce": None,
                 "peer_nonce": None,
                 "finalize_retry_count": 0,
@@ -487,16 +784,16 @@ async def handle_close(payload: dict) -> Optional[Event]:
                 "peer_address": addr
             })
         # Clear per-peer nonce log after both refs present.
-        await NonceEvent.delete(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id})
+        clear_nonces("responder", peer_id)
 
-        client.logger.info(f"[resp_finalize -> resp_ready] CLOSE SUCCESS")
+        client.logger.info("[resp_finalize -> resp_ready] CLOSE SUCCESS")
         return Move(Trigger.ok)
     
     # Retry path (we didn't see a valid 'close' yet).
-    if int(row.get("finalize_retry_count", 0)) > RESP_FINAL_LIMIT:
+    if retry_count > RESP_FINAL_LIMIT:
         # Responder failure -> wipe refs to avoid stale reconnect loops.
         client.logger.warning("[resp_finalize -> resp_ready] FINALIZE RETRY LIMIT REACHED | FAILED TO CLOSE")
-        await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id},
+        update_role_state("responder", peer_id,
             fields={
                 "local_nonce": None, 
                 "peer_nonce": None,
@@ -508,8 +805,7 @@ async def handle_close(payload: dict) -> Optional[Event]:
             })
         return Move(Trigger.error)
 
-    new_retry = int(row.get("finalize_retry_count", 0)) + 1
-    await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id}, fields={"finalize_retry_count": new_retry, "peer_address": addr})
+    update_role_state("responder", peer_id, fields={"finalize_retry_count": retry_count + 1, "peer_address": addr})
     return Stay(Trigger.ok)
 
 
@@ -528,25 +824,26 @@ async def handle_confirm(payload: dict) -> Optional[Event]:
     addr = payload["remote_addr"]
     content = payload["content"]
     peer_id = content["from"]
+    my_nonce = content.get("my_nonce")
 
     if not(content["intent"] == "confirm" and content["to"] is not None): return
     client.logger.info("[init_ready -> init_exchange] intent OK")
 
-    if not("my_nonce" in content): return Stay(Trigger.ignore)
+    if my_nonce is None: return Stay(Trigger.ignore)
     client.logger.info("[init_ready -> init_exchange] validation OK")
 
     await ensure_role_state(my_id, "initiator", peer_id, "init_ready")
-    await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id},
+    update_role_state("initiator", peer_id,
         fields={
-            "peer_nonce": content["my_nonce"], 
+            "peer_nonce": my_nonce, 
             "exchange_count": 0,
             "local_nonce": None,
             "peer_reference": None,
             "local_reference": None,
             "peer_address": addr
         })
-    await NonceEvent.insert(db, self_id=my_id, role="initiator", peer_id=peer_id, flow="received", nonce=content["my_nonce"])
-    client.logger.info(f"[init_ready -> init_exchange] peer_nonce set: {content['my_nonce']}")
+    record_nonce("initiator", peer_id, "received", my_nonce)
+    client.logger.info("[init_ready -> init_exchange] peer_nonce set: %s", my_nonce)
     return Move(Trigger.ok)
 
 @client.receive(route="init_exchange --> init_finalize_propose")
@@ -563,35 +860,40 @@ async def handle_respond(payload: dict) -> Optional[Event]:
     addr = payload["remote_addr"]
     content = payload["content"]
     peer_id = content["from"]
+    your_nonce = content.get("your_nonce")
+    my_nonce = content.get("my_nonce")
 
     if not(content["intent"] == "respond" and content["to"] is not None): return Stay(Trigger.ignore)
     client.logger.info("[init_exchange -> init_finalize_propose] intent OK")
 
-    if not("your_nonce" in content and "my_nonce" in content): return Stay(Trigger.ignore)
+    if your_nonce is None or my_nonce is None: return Stay(Trigger.ignore)
     client.logger.info("[init_exchange -> init_finalize_propose] validation OK")
 
-    row = await ensure_role_state(my_id, "initiator", peer_id, "init_ready")
-    client.logger.info(f"[init_exchange -> init_finalize_propose] check local_nonce={row.get('local_nonce')!r} ?= your_nonce={content['your_nonce']!r}")
-    if row.get("local_nonce") != content["your_nonce"]:
+    row = peek_role_state("initiator", peer_id)
+    if row is None: return Stay(Trigger.ignore)
+    local_nonce = row.get("local_nonce")
+    client.logger.info("[init_exchange -> init_finalize_propose] check local_nonce=%r ?= your_nonce=%r", local_nonce, your_nonce)
+    if local_nonce != your_nonce:
         return Stay(Trigger.ignore)
 
     # Replay guard: inbound my_nonce must be new for this (self,role,peer)
-    seen_my_nonce = await NonceEvent.exists(db, {"self_id": my_id, "role": "initiator", "peer_id": peer_id, "flow": "received", "nonce": content["my_nonce"]})
+    seen_my_nonce = await nonce_received("initiator", peer_id, my_nonce)
     if seen_my_nonce:
-        client.logger.info(f"[init_exchange -> init_finalize_propose] received my_nonce={content['my_nonce']!r} previously used")
+        client.logger.info("[init_exchange -> init_finalize_propose] received my_nonce=%r previously used", my_nonce)
         return Stay(Trigger.ignore)
 
-    if int(row.get("exchange_count", 0)) > EXCHANGE_LIMIT:
-        # Accept their nonce, reset counter, proceed to finalize proposal.
-        await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id}, fields={"peer_nonce": content["my_nonce"], "local_nonce": None, "peer_address": addr})
-        await NonceEvent.insert(db, self_id=my_id, role="initiator", peer_id=peer_id, flow="received", nonce=content["my_nonce"])
-        client.logger.info(f"[init_exchange -> init_finalize_propose] EXCHANGE CUT (limit reached)")
+    exchange_count = int(row.get("exchange_count", 0))
+
+    # Store peer nonce, clear ours (we'll generate new on send)
+    update_role_state("initiator", peer_id, fields={"peer_nonce": my_nonce, "local_nonce": None, "peer_address": addr})
+    record_nonce("initiator", peer_id, "received", my_nonce)
+
+    if exchange_count > EXCHANGE_LIMIT:
+        # Limit reached: proceed to finalize proposal.
+        client.logger.info("[init_exchange -> init_finalize_propose] EXCHANGE CUT (limit reached)")
         return Move(Trigger.ok)
 
-    # Normal path: store peer nonce, clear ours (we'll generate new on send)
-    await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id}, fields={"peer_nonce": content["my_nonce"], "local_nonce": None, "peer_address": addr})
-    await NonceEvent.insert(db, self_id=my_id, role="initiator", peer_id=peer_id, flow="received", nonce=content["my_nonce"])
-    client.logger.info(f"[init_exchange -> init_finalize_propose] GOT RESPONSE #{row.get('exchange_count', 0)}")
+    client.logger.info("[init_exchange -> init_finalize_propose] GOT RESPONSE #%s", exchange_count)
     return Stay(Trigger.ok)
 
 @client.receive(route="init_finalize_propose --> init_finalize_close")
@@ -605,27 +907,31 @@ async def handle_finish(payload: dict) -> Optional[Event]:
     addr = payload["remote_addr"]
     content = payload["content"]
     peer_id = content["from"]
+    your_ref = content.get("your_ref")
+    my_ref = content.get("my_ref")
 
     if not(content["intent"] == "finish" and content["to"] is not None): return Stay(Trigger.ignore)
     client.logger.info("[init_finalize_propose -> init_finalize_close] intent OK")
 
-    if not("your_ref" in content and "my_ref" in content): return Stay(Trigger.ignore)
+    if your_ref is None or my_ref is None: return Stay(Trigger.ignore)
     client.logger.info("[init_finalize_propose -> init_finalize_close] validation OK")
 
-    row = await ensure_role_state(my_id, "initiator", peer_id, "init_ready")
-    client.logger.info(f"[init_finalize_propose -> init_finalize_close] check local_reference={row.get('local_reference')!r} ?= your_ref={content['your_ref']!r}")
-    if row.get("local_reference") != content["your_ref"]:
+    row = peek_role_state("initiator", peer_id)
+    if row is None: return Stay(Trigger.ignore)
+    local_ref = row.get("local_reference")
+    client.logger.info("[init_finalize_propose -> init_finalize_close] check local_reference=%r ?= your_ref=%r", local_ref, your_ref)
+    if local_ref != your_ref:
         return Stay(Trigger.ignore)
 
     # Success: capture responder's ref; clear transient nonce log.
-    await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id}, 
-            fields={
-                "peer_reference": content["my_ref"], 
+    update_role_state("initiator", peer_id,
+        fields={
+                "peer_reference": my_ref, 
                 "finalize_retry_count": 0, 
                 "peer_address": addr
             })
     # Clear per-peer nonce log after both refs present.
-    await NonceEvent.delete(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id})
+    clear_nonces("initiator", peer_id)
     client.logger.info("[init_finalize_propose -> init_finalize_close] CLOSE")
     return Move(Trigger.ok)
 
@@ -641,9 +947,10 @@ async def finish_to_idle(payload: dict) -> Optional[Event]:
 
     if peer_id is None: return Stay(Trigger.ignore)
 
-    row = await ensure_role_state(my_id, "initiator", peer_id, "init_ready")
+    row = peek_role_state("initiator", peer_id)
+    if row is None: return Stay(Trigger.ignore)
     if int(row.get("finalize_retry_count", 0)) > INIT_FINAL_LIMIT:
-        await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id},
+        update_role_state("initiator", peer_id,
             fields={
                 "local_nonce": None,
                 "peer_nonce": None,
@@ -660,92 +967,226 @@ async def finish_to_idle(payload: dict) -> Optional[Event]:
 
 """ ============================ SEND DRIVER ================================ """
 
+_next_tick: Optional[float] = None
+
+async def wait_for_next_tick() -> None:
+    """
+    Sleep until the next SEND_TICK_INTERVAL boundary instead of a flat interval after
+    the work, so slow DB calls do not accumulate into tick drift. If we fell behind by
+    more than a full interval, resynchronize rather than firing a burst of catch-up ticks.
+    """
+    global _next_tick
+    now = asyncio.get_running_loop().time()
+    if _next_tick is None or _next_tick < now - SEND_TICK_INTERVAL:
+        _next_tick = now + SEND_TICK_INTERVAL
+    await asyncio.sleep(max(0.0, _next_tick - now))
+    _next_tick += SEND_TICK_INTERVAL
+
+# ------------------------- Per-state send handlers --------------------------
+# Each handler is a pure function of the cached row: it returns
+# (payload | None, RoleState fields to write | None, minted nonce to log as 'sent' | None).
+# State names are role-prefixed, so one table per driver covers both roles.
+
+def _send_reconnect(row: dict, log_info: bool) -> tuple:
+    """init_ready: reconnect only if we remember peer_reference from a prior finalize."""
+    peer_id = row["peer_id"]
+    peer_ref = row["peer_reference"]
+    if not (peer_id and peer_ref):
+        return None, None, None
+    if log_info: client.logger.info("[send][initiator:init_ready] reconnect with %s under %s", peer_id, peer_ref)
+    return {"to": peer_id, "your_ref": peer_ref, "intent": "reconnect"}, None, None
+
+def _send_close(row: dict, log_info: bool) -> tuple:
+    """init_finalize_close: retry close until we exceed INIT_FINAL_LIMIT; refs are preserved for reconnect."""
+    # Guard: cannot send close until both refs are known.
+    peer_ref = row["peer_reference"]
+    local_ref = row["local_reference"]
+    if peer_ref is None or local_ref is None:
+        if log_info: client.logger.info("[send][initiator:init_finalize_close] waiting for refs before close")
+        return None, None, None
+    retry_count = row["finalize_retry_count"]
+    if retry_count > INIT_FINAL_LIMIT:
+        if log_info: client.logger.info("[init_finalize_close -> init_ready] CUT (refs preserved)")
+        return None, {
+            "local_nonce": None,
+            "peer_nonce": None,
+            # keep local_reference / peer_reference
+            "state": "init_ready",
+            "exchange_count": 0,
+            "finalize_retry_count": 0
+        }, None
+    new_retry = retry_count + 1
+    if log_info: client.logger.info("[send][initiator:init_finalize_close] close #%s | your_ref=%s", new_retry, peer_ref)
+    payload = {
+        "to": row["peer_id"],
+        "intent": "close",
+        "your_ref": peer_ref,
+        "my_ref": local_ref,
+    }
+    return payload, {"finalize_retry_count": new_retry}, None
+
+def _send_finish(row: dict, log_info: bool) -> tuple:
+    """resp_finalize: return our reference (we already stored the initiator's peer_reference)."""
+    # Guard: need peer_reference for your_ref in finish.
+    peer_ref = row["peer_reference"]
+    if peer_ref is None:
+        if log_info: client.logger.info("[send][responder:resp_finalize] waiting for peer_reference before finish")
+        return None, None, None
+    # Mint local_reference here (not in receive) to avoid races with queued_sender.
+    local_ref = row["local_reference"] or generate_random_digits()
+    if log_info: client.logger.info("[send][responder:resp_finalize] finish #%s | my_ref=%s", row["finalize_retry_count"], local_ref)
+    payload = {
+        "to": row["peer_id"],
+        "intent": "finish",
+        "your_ref": peer_ref,
+        "my_ref": local_ref,
+    }
+    return payload, {"local_reference": local_ref}, None
+
+def _send_request(row: dict, log_info: bool) -> tuple:
+    """init_exchange: next request of the ping-pong; bump initiator exchange_count on send."""
+    # Guard: must have peer_nonce to echo back as your_nonce.
+    peer_nonce = row["peer_nonce"]
+    if peer_nonce is None:
+        if log_info: client.logger.info("[send][initiator:init_exchange] waiting for peer_nonce before first request")
+        return None, None, None
+    # Mint next my_nonce after receive cleared local_nonce.
+    new_cnt = row["exchange_count"] + 1
+    local_nonce = row["local_nonce"] or generate_random_digits()
+    if log_info: client.logger.info("[send][initiator:init_exchange] request #%s | my_nonce=%s", new_cnt, local_nonce)
+    payload = {
+        "to": row["peer_id"],
+        "intent": "request",
+        "your_nonce": peer_nonce,
+        "my_nonce": local_nonce,
+        "message": "How are you?"
+    }
+    return payload, {"local_nonce": local_nonce, "exchange_count": new_cnt}, local_nonce
+
+def _send_conclude(row: dict, log_info: bool) -> tuple:
+    """init_finalize_propose: propose our reference; bump initiator finalize_retry_count on send."""
+    # Guard: must have peer_nonce to echo in conclude.
+    peer_nonce = row["peer_nonce"]
+    if peer_nonce is None:
+        if log_info: client.logger.info("[send][initiator:init_finalize_propose] waiting for peer_nonce before conclude")
+        return None, None, None
+    new_retry = row["finalize_retry_count"] + 1
+    local_ref = row["local_reference"] or generate_random_digits()
+    if log_info: client.logger.info("[send][initiator:init_finalize_propose] conclude #%s | my_ref=%s", new_retry, local_ref)
+    payload = {
+        "to": row["peer_id"],
+        "intent": "conclude",
+        "your_nonce": peer_nonce,
+        "my_ref": local_ref,
+    }
+    return payload, {"local_reference": local_ref, "finalize_retry_count": new_retry}, None
+
+def _send_confirm(row: dict, log_info: bool) -> tuple:
+    """resp_confirm: answer a hello with our first my_nonce."""
+    # Mint next my_nonce after receive cleared local_nonce
+    local_nonce = row["local_nonce"] or generate_random_digits()
+    if log_info: client.logger.info("[send][responder:resp_confirm] confirm | my_nonce=%s", local_nonce)
+    payload = {"to": row["peer_id"], "intent": "confirm", "my_nonce": local_nonce}
+    return payload, {"local_nonce": local_nonce}, local_nonce
+
+def _send_respond(row: dict, log_info: bool) -> tuple:
+    """resp_exchange: answer a request; responder bumps exchange_count on receive only."""
+    # Guard: need peer_nonce for your_nonce field in respond.
+    peer_nonce = row["peer_nonce"]
+    if peer_nonce is None:
+        if log_info: client.logger.info("[send][responder:resp_exchange] waiting for peer_nonce before respond")
+        return None, None, None
+    # Mint next my_nonce after receive cleared local_nonce.
+    local_nonce = row["local_nonce"] or generate_random_digits()
+    if log_info: client.logger.info("[send][responder:resp_exchange] respond #%s | my_nonce=%s", row["exchange_count"], local_nonce)
+    payload = {
+        "to": row["peer_id"],
+        "intent": "respond",
+        "your_nonce": peer_nonce,
+        "my_nonce": local_nonce,
+        "message": "I am OK!"
+    }
+    return payload, {"local_nonce": local_nonce}, local_nonce
+
+# state -> send handler, per driver
+TICK_SEND_HANDLERS = {
+    "init_ready": _send_reconnect,
+    "init_finalize_close": _send_close,
+    "resp_finalize": _send_finish,
+}
+QUEUED_SEND_HANDLERS = {
+    "init_exchange": _send_request,
+    "init_finalize_propose": _send_conclude,
+    "resp_confirm": _send_confirm,
+    "resp_exchange": _send_respond,
+}
+
+def drive_rows(handlers: dict) -> list[dict]:
+    """
+    Shared body of both send drivers: walk the cached rows in each handled state, run
+    the handler registered for that state, and collect payloads. Row changes are applied to
+    role_cache at the end of the pass (role_flusher writes them back), and the sent-nonce
+    log entries are queued as one insert_many.
+    """
+    payloads, updates = [], []
+    # Per-row log lines use lazy %-args behind one level check per tick.
+    log_info = client.logger.isEnabledFor(logging.INFO)
+
+    # Visit only the known peers (both roles) whose state this driver handles.
+    for state, handler in handlers.items():
+        for row in rows_by_state.get(state, {}).values():
+            payload, fields, sent_nonce = handler(row, log_info)
+            if fields is not None:
+                updates.append((row, fields))
+            if sent_nonce is not None:
+                record_nonce(row["role"], row["peer_id"], "sent", sent_nonce)
+            if payload is not None:
+                payloads.append(payload)
+
+    # Apply after the walk (a state change moves the row between rows_by_state groups).
+    for row, fields in updates:
+        apply_role_fields(row, fields)
+        mark_dirty(row)
+    return payloads
+
 @client.send(route="sending", multi=True)
 async def tick_background_sender() -> list[dict]:
     """
     Background sender (periodic "maintenance").
       - Initiator: handles reconnect attempts and the close loop (finish ACK retries).
       - Responder: sends finish when in resp_finalize (we already stored peer_reference).
-      - Also broadcasts 'register' every tick so new peers can discover us.
-      - Sleeps ~1s to simulate paced traffic.
+      - Per-state work is dispatched through TICK_SEND_HANDLERS.
+      - Paced at SEND_TICK_INTERVAL (see wait_for_next_tick).
     """
     client.logger.info("[send tick]")
-    await asyncio.sleep(1)
-    payloads = []
-
-    # Iterate all known peers for both roles (multi-peer)
-    init_rows = await RoleState.find(db, where={"self_id": my_id, "role": "initiator"})
-    resp_rows = await RoleState.find(db, where={"self_id": my_id, "role": "responder"})
-
-    # ---------------------------- Initiator role ----------------------------
-    for row in init_rows:
-        role_state = row.get("state") or "init_ready"
-        peer_id    = row["peer_id"]
-        payload = None
-        if role_state == "init_ready":
-            # Reconnect path: only if we remember peer_reference from prior finalize.
-            if peer_id and row.get("peer_reference"):
-                client.logger.info(f"[send][initiator:{role_state}] reconnect with {peer_id} under {row.get('peer_reference')}")
-                payload = {"to": peer_id, "your_ref": row.get("peer_reference"), "intent": "reconnect"}
-
-        elif role_state == "init_finalize_close":
-            # Guard: cannot send close until both refs are known.
-            if row.get("peer_reference") is None or row.get("local_reference") is None:
-                client.logger.info(f"[send][initiator:{role_state}] waiting for refs before close")
-                continue
-            # Retry close until we exceed INIT_FINAL_LIMIT; refs are preserved for reconnect.
-            if int(row.get("finalize_retry_count", 0)) > INIT_FINAL_LIMIT:
-                await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id},
-                    fields={
-                        "local_nonce": None,
-                        "peer_nonce": None,
-                        # keep local_reference / peer_reference
-                        "state": "init_ready",
-                        "exchange_count": 0,
-                        "finalize_retry_count": 0
-                    })
-                client.logger.info("[init_finalize_close -> init_ready] CUT (refs preserved)")
-            else:
-                new_retry = int(row.get("finalize_retry_count", 0)) + 1
-                await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id}, fields={"finalize_retry_count": new_retry})
-                client.logger.info(f"[send][initiator:{role_state}] close #{new_retry} | your_ref={row.get('peer_reference')}")
-                payload = {
-                    "to": peer_id,
-                    "intent": "close",
-                    "your_ref": row.get("peer_reference"),
-                    "my_ref": row.get("local_reference"),
-                }
-
-        if payload is not None:
-            payloads.append(payload)
-
-    # ---------------------------- Responder role ----------------------------
-    for row in resp_rows:
-        role_state = row.get("state") or "resp_ready"
-        peer_id    = row["peer_id"]
-        payload = None
-        if role_state == "resp_finalize":
-            # Guard: need peer_reference for your_ref in finish.
-            if row.get("peer_reference") is None:
-                client.logger.info(f"[send][responder:{role_state}] waiting for peer_reference before finish")
-                continue
-            # Mint local_reference here (not in receive) to avoid races with queued_sender.
-            local_ref = row.get("local_reference") or generate_random_digits()
-            await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id}, fields={"local_reference": local_ref})
-            client.logger.info(f"[send][responder:{role_state}] finish #{row.get('finalize_retry_count', 0)} | my_ref={local_ref}")
-            payload = {
-                "to": peer_id,
-                "intent": "finish",
-                "your_ref": row.get("peer_reference"),
-                "my_ref": local_ref,
-            }
-
-        if payload is not None:
-            payloads.append(payload)
-
-    # Broadcast a registration each tick so new peers can discover us (low-cost discovery); harmless under high fan-out.
-    payloads.append({"to": None, "intent": "register"})
-    return payloads
+    await wait_for_next_tick()
+    return drive_rows(TICK_SEND_HANDLERS)
+
+register_interval = REGISTER_INTERVAL_MIN
+# Set by reset_register_interval() to cut the current wait short.
+register_reset_event = asyncio.Event()
+
+def reset_register_interval() -> None:
+    global register_interval
+    register_interval = REGISTER_INTERVAL_MIN
+    register_reset_event.set()
+
+@client.send(route="register")
+async def register_sender() -> dict:
+    """
+    Discovery ticker: broadcast a 'register' so new peers can discover us, backing off
+    (REGISTER_BACKOFF, capped at REGISTER_INTERVAL_MAX) while the peer set is stable.
+    Runs apart from the send drivers, which only walk RoleState rows. A new peer
+    (reset_register_interval) ends the current wait, so it is announced right away.
+    """
+    global register_interval
+    try:
+        await asyncio.wait_for(register_reset_event.wait(), timeout=register_interval)
+    except asyncio.TimeoutError:
+        pass
+    register_reset_event.clear()
+    register_interval = min(register_interval * REGISTER_BACKOFF, REGISTER_INTERVAL_MAX)
+    return REGISTER_PAYLOAD
 
 @client.send(route="/all --> /all", multi=True, on_triggers = {Trigger.ok, Trigger.error})
 async def queued_sender() -> list[dict]:
@@ -755,97 +1196,18 @@ async def queued_sender() -> list[dict]:
         state updates (notably local_nonce clearing) are visible before we mint new nonces.
       - Initiator path: drives request cycles and conclude.
       - Responder path: drives confirm/respond cycles.
+      - Per-state work is dispatched through QUEUED_SEND_HANDLERS.
       - Nonces minted here are logged with flow='sent'; replay protection only checks 'received'.
-      - Sleeps ~1s to simulate paced traffic.
+      - Waits on wake_event (set by receive-side RoleState writes), falling back to
+        SEND_TICK_INTERVAL, instead of sleeping a fixed 1s per tick.
     """
     client.logger.info("[queued send tick]")
-    await asyncio.sleep(1)
-    payloads = []
-
-    # iterate all known peers for both roles (multi-peer)
-    init_rows = await RoleState.find(db, where={"self_id": my_id, "role": "initiator"})
-    resp_rows = await RoleState.find(db, where={"self_id": my_id, "role": "responder"})
-
-    # ---------------------------- Initiator role ----------------------------
-    for row in init_rows:
-        role_state = row.get("state") or "init_ready"
-        peer_id    = row["peer_id"]
-        payload = None
-
-        if role_state == "init_exchange":
-            # Guard: must have peer_nonce to echo back as your_nonce.
-            if row.get("peer_nonce") is None:
-                client.logger.info(f"[send][initiator:{role_state}] waiting for peer_nonce before first request")
-                continue
-            # Mint next my_nonce after receive cleared local_nonce; bump initiator exchange_count on send.
-            new_cnt = int(row.get("exchange_count", 0)) + 1
-            local_nonce = row.get("local_nonce") or generate_random_digits()
-            await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id}, fields={"local_nonce": local_nonce, "exchange_count": new_cnt})
-            await NonceEvent.insert(db, self_id=my_id, role="initiator", peer_id=peer_id, flow="sent", nonce=local_nonce)
-            client.logger.info(f"[send][initiator:{role_state}] request #{new_cnt} | my_nonce={local_nonce}")
-            payload = {
-                "to": peer_id,
-                "intent": "request",
-                "your_nonce": row.get("peer_nonce"),
-                "my_nonce": local_nonce,
-                "message": "How are you?"
-            }
-
-        elif role_state == "init_finalize_propose":
-            # Guard: must have peer_nonce to echo in conclude.
-            if row.get("peer_nonce") is None:
-                client.logger.info(f"[send][initiator:{role_state}] waiting for peer_nonce before conclude")
-                continue
-            # Mint next my_nonce after receive cleared local_nonce; bump initiator finalize_retry_count on send.
-            new_retry = int(row.get("finalize_retry_count", 0)) + 1
-            local_ref = row.get("local_reference") or generate_random_digits()
-            await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id}, fields={"local_reference": local_ref, "finalize_retry_count": new_retry})
-            client.logger.info(f"[send][initiator:{role_state}] conclude #{new_retry} | my_ref={local_ref}")
-            payload = {
-                "to": peer_id,
-                "intent": "conclude",
-                "your_nonce": row.get("peer_nonce"),
-                "my_ref": local_ref,
-            }
-
-        if payload is not None:
-            payloads.append(payload)
-
-    # ---------------------------- Responder role ----------------------------
-    for row in resp_rows:
-        role_state = row.get("state") or "resp_ready"
-        peer_id    = row["peer_id"]
-        payload = None
-        if role_state == "resp_confirm":
-            # Mint next my_nonce after receive cleared local_nonce
-            local_nonce = row.get("local_nonce") or generate_random_digits()
-            await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id}, fields={"local_nonce": local_nonce})
-            await NonceEvent.insert(db, self_id=my_id, role="responder", peer_id=peer_id, flow="sent", nonce=local_nonce)
-            client.logger.info(f"[send][responder:{role_state}] confirm | my_nonce={local_nonce}")
-            payload = {"to": peer_id, "intent": "confirm", "my_nonce": local_nonce}
-
-        elif role_state == "resp_exchange":
-            # Guard: need peer_nonce for your_nonce field in respond.
-            if row.get("peer_nonce") is None:
-                client.logger.info(f"[send][responder:{role_state}] waiting for peer_nonce before respond")
-                continue
-            # Mint next my_nonce after receive cleared local_nonce; responder bumps exchange_count on receive only.
-            local_nonce = row.get("local_nonce") or generate_random_digits()
-            await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id}, fields={"local_nonce": local_nonce})
-            await NonceEvent.insert(db, self_id=my_id, role="responder", peer_id=peer_id, flow="sent", nonce=local_nonce)
-            client.logger.info(f"[send][responder:{role_state}] respond #{row.get('exchange_count', 0)} | my_nonce={local_nonce}")
-            payload = {
-                "to": peer_id,
-                "intent": "respond",
-                "your_nonce": row.get("peer_nonce"),
-                "my_nonce": local_nonce,
-                "message": "I am OK!"
-            }
-
-        if payload is not None:
-            payloads.append(payload)
-
-    return payloads
+    try:
+        await asyncio.wait_for(wake_event.wait(), timeout=SEND_TICK_INTERVAL)
+    except asyncio.TimeoutError:
+        pass
+    wake_event.clear()
+    return drive_rows(QUEUED_SEND_HANDLERS)
 
 
 
@@ -858,8 +1220,15 @@ if __name__ == "__main__":
 
     # Ensure DB schema before client loop starts.
     client.loop.run_until_complete(setup())
+    db_writer_task = client.loop.create_task(db_writer())
+    role_flusher_task = client.loop.create_task(role_flusher())
 
     try:
         client.run(host="127.0.0.1", port=8888, config_path=args.config_path or "configs/client_config.json")
     finally:
-        asyncio.run(db.close())
+        # Drain on the loop that owns the DB connection and the writer task; a fresh
+        # loop is only used if the client already closed its own.
+        if client.loop.is_closed():
+            asyncio.run(shutdown())
+        else:
+            client.loop.run_until_complete(shutdown())
@@ -23,7 +23,7 @@ class RoleState(Model):
 class NonceEvent(Model):
     """
     Append-only nonce log for the *current* conversation with a given peer.
-    Clear rows by (self_id, role, peer_id) after final handshake.
+    Clear rows by (role, peer_id) after final handshake.
     """
     __tablename__ = "nonce_event"
     id         = Field("INTEGER", primary_key=True)
@@ -23,12 +23,19 @@
 #
 # STATE & STORAGE
 #   - RoleState rows track per-thread state, nonces, references, counters, peer addr.
+#     They are loaded into role_cache at startup and read from there; every write goes
+#     through update_role_state(), which updates the cached row at once and leaves the
+#     table to role_flusher (one bulk_update per ROLE_FLUSH_WINDOW of changes).
 #   - NonceEvent logs nonces {sent|received}. "received" is used for replay defense,
 #     including the hs replay window (via DBNonceStore). We clear rows after finalize.
-#   - SYM_KEYS[(role, peer)] lives in RAM only (not persisted).
+#     Rows are queued by record_nonce() and written in batches (flush_nonce_events);
+#     nonce_seen() consults the queue before the table.
+#   - SYM_KEYS[(role, peer)] lives in RAM only (not persisted), as does its
+#     AES-GCM nonce counter ENV_NONCES[(role, peer)].
 #   - PEER_SIGN_PUB[(role, peer)] lives in RAM and is also persisted to RoleState.* for
 #     convenience; maybe_open_secure() will fall back to DB if RAM key isn't populated.
-#   - Optional persistence via persist_crypto_meta (best-effort; safe if columns exist).
+#   - Optional persistence of crypto metadata (best-effort; only columns the table has).
+#     Handshake metadata rides on the handler's own RoleState update (crypto_meta_fields).
 #
 # INVARIANTS
 #   1) Echo rule (nonces):
@@ -74,9 +81,10 @@ import datetime as _dt
 import secrets
 from cryptography.hazmat.primitives.asymmetric import x25519, ed25519
 from crypto_utils import (
-    seal_envelope, open_envelope,
+    seal_envelope, open_envelope, gcm_nonce_sequence,
     build_handshake_message,
     validate_handshake_message,
+    serialize_public_key,
     load_identity_json_encrypted, save_identity_json_encrypted
 )
 
@@ -120,14 +128,25 @@ except FileNotFoundError:
     save_identity_json_encrypted(str(IDENT_PATH), IDENT_PASSWORD, my_id, kx_priv, sign_priv)
     print("[identity] generated new identity and saved (encrypted)")
 
+# Our public keys, serialized once for every handshake we sign (see build_handshake_message).
+KX_PUB_B64 = serialize_public_key(kx_priv.public_key())
+SIGN_PUB_B64 = serialize_public_key(sign_priv.public_key())
+
 # In-RAM per-peer crypto context (derived after validating the first signed message)
 # Keyed by (role, peer_id)
 SYM_KEYS: dict[tuple[str, str], bytes] = {}
 PEER_SIGN_PUB: dict[tuple[str, str], str] = {}
+# AES-GCM nonce counter for the envelopes we seal under SYM_KEYS[(role, peer_id)];
+# restarted (fresh random prefix) whenever that key is (re)derived.
+ENV_NONCES: dict[tuple[str, str], Any] = {}
 
 # Optional: attempt to persist crypto metadata; leave ON (safe if columns exist, no-op otherwise)
 PERSIST_CRYPTO = True
 
+# Columns of the on-disk role_state table, read in setup(). Crypto metadata is only written
+# to columns that exist, so databases created before those columns keep working.
+role_state_columns: set[str] = set()
+
 
 
 """ ============================= DATABASE WIRING =========================== """
@@ -136,7 +155,15 @@ from db_sdk import Database
 from db_models import RoleState, NonceEvent
 
 db_path = Path(__file__).resolve().parent / f"HSAgent-{my_id}.db"
-db = Database(db_path)
+# Every inbound message and sent handshake appends to NonceEvent: WAL with
+# synchronous=NORMAL turns those per-commit fsyncs into WAL appends.
+db = Database(db_path, pragmas={
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "mmap_size": 268435456,
+    "busy_timeout": 5000,
+})
 
 async def setup() -> None:
     """
@@ -167,6 +194,33 @@ async def setup() -> None:
     await NonceEvent.create_index(db, "ix_nonce_triplet", ["self_id", "role", "peer_id"], unique=False)
     await NonceEvent.create_index(db, "ix_nonce_exists", ["self_id", "role", "peer_id", "flow", "nonce"], unique=False)
 
+    role_state_columns.update(r["name"] for r in await db.fetchall("PRAGMA table_info(role_state)"))
+
+    for row in await RoleState.find(db, where={"self_id": my_id}):
+        role_cache[(row["role"], row["peer_id"])] = row
+
+async def stop_task(task: Optional[asyncio.Task]) -> None:
+    """Cancel a background task started on this loop and wait until it has unwound."""
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        return
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+async def shutdown() -> None:
+    """
+    Stop role_flusher, let in-flight NonceEvent flushes finish, write any queued RoleState
+    changes and NonceEvent rows, then close the database. Runs on client.loop (see
+    __main__), where those tasks, nonce_lock and the DB connection live.
+    """
+    await stop_task(role_flusher_task)
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(t for t in nonce_flush_tasks if t.get_loop() is loop), return_exceptions=True)
+    # Only if the client closed its loop first: roll back a block a flush was left inside.
+    await db.abandon_transaction()
+    await flush_role_state()
+    await flush_nonce_events()
+    await db.close()
+
 
 
 """ ============================= CRYPTO HELPERS ============================ """
@@ -183,17 +237,7 @@ class DBNonceStore:
         self.ttl_seconds = ttl_seconds
 
     async def exists(self, nonce: str) -> bool:
-        rows = await NonceEvent.find(
-            db,
-            where={
-                "self_id": self.self_id,
-                "role": self.role,
-                "peer_id": self.peer_id,
-                "flow": "received",
-                "nonce": nonce,
-            }
-        )
-        return bool(rows)
+        return await nonce_seen(self.role, self.peer_id, "received", nonce)
 
     def is_expired(self, ts: _dt.datetime) -> bool:
         return (_dt.datetime.now() - ts).total_seconds() > self.ttl_seconds
@@ -203,43 +247,108 @@ class DBNonceStore:
         await record_received_nonce_once(self.role, self.peer_id, nonce)
 
 
+# NonceEvent write batching. record_nonce() queues a row instead of inserting it; the
+# first row queued schedules flush_nonce_events() with call_soon, so every row recorded
+# until the flush runs goes out in one insert_many (one executemany, one commit).
+# NONCE_BATCH_MAX rows trigger a flush right away and cap the size of each batch.
+# nonce_pending keeps each row's key until its batch has committed, so nonce_seen()
+# never misses a nonce that is still queued or being written. A batch that fails to
+# commit is rolled back to the front of the queue and retried after NONCE_FLUSH_RETRY.
+# Flush tasks run beside the handlers, so every write here and in the handlers
+# (get_or_create, clear_nonces) runs in its own db.transaction(): the Database lock
+# keeps one task's statements out of another's block and its rollback.
+NONCE_BATCH_MAX = 256
+NONCE_FLUSH_RETRY = 1.0  # seconds
+nonce_batch: list[dict] = []
+nonce_pending: set[tuple[str, str, str, str]] = set()
+nonce_lock = asyncio.Lock()
+# Running flush tasks; the loop only keeps weak references to tasks.
+nonce_flush_tasks: set[asyncio.Task] = set()
+
+def record_nonce(role: str, peer_id: str, flow: str, nonce: str) -> None:
+    nonce_batch.append({"self_id": my_id, "role": role, "peer_id": peer_id, "flow": flow, "nonce": nonce})
+    nonce_pending.add((role, peer_id, flow, nonce))
+    if len(nonce_batch) == 1:
+        asyncio.get_running_loop().call_soon(schedule_nonce_flush)
+    elif len(nonce_batch) == NONCE_BATCH_MAX:
+        schedule_nonce_flush()
+
+def schedule_nonce_flush() -> None:
+    task = asyncio.get_running_loop().create_task(flush_nonce_events())
+    nonce_flush_tasks.add(task)
+    task.add_done_callback(nonce_flush_done)
+
+def nonce_flush_done(task: asyncio.Task) -> None:
+    """Forget a finished flush task; log a failed one and schedule a retry."""
+    nonce_flush_tasks.discard(task)
+    if task.cancelled() or task.exception() is None:
+        return
+    client.logger.error("[nonce_flush] NonceEvent insert failed; retrying", exc_info=task.exception())
+    asyncio.get_running_loop().call_later(NONCE_FLUSH_RETRY, schedule_nonce_flush)
+
+async def flush_nonce_events() -> None:
+    """Write queued NonceEvent rows, at most NONCE_BATCH_MAX per commit."""
+    async with nonce_lock:
+        while nonce_batch:
+            batch = nonce_batch[:NONCE_BATCH_MAX]
+            del nonce_batch[:NONCE_BATCH_MAX]
+            try:
+                async with db.transaction():
+                    await NonceEvent.insert_many(db, batch)
+            except Exception:
+                # Back to the front of the queue, so every key in nonce_pending still has a row.
+                nonce_batch[:0] = batch
+                raise
+            nonce_pending.difference_update((e["role"], e["peer_id"], e["flow"], e["nonce"]) for e in batch)
+
+async def nonce_seen(role: str, peer_id: str, flow: str, nonce: str) -> bool:
+    """True if (role, peer_id, flow, nonce) is queued or already in NonceEvent."""
+    if (role, peer_id, flow, nonce) in nonce_pending:
+        return True
+    return await NonceEvent.exists(db, {"self_id": my_id, "role": role, "peer_id": peer_id, "flow": flow, "nonce": nonce})
+
+async def clear_nonces(role: str, peer_id: str) -> None:
+    """Drop the per-peer nonce log, queued rows included."""
+    async with nonce_lock:
+        nonce_batch[:] = [e for e in nonce_batch if e["role"] != role or e["peer_id"] != peer_id]
+        nonce_pending.difference_update([k for k in nonce_pending if k[0] == role and k[1] == peer_id])
+        async with db.transaction():
+            await NonceEvent.delete(db, where={"self_id": my_id, "role": role, "peer_id": peer_id})
+
+
 # Idempotent "received" nonce recorder used by both hs validator and normal paths.
 # Guarantees at-most-once insertion for a given (self_id, role, peer_id, nonce).
 async def record_received_nonce_once(role: str, peer_id: str, nonce: Optional[str]) -> None:
     if not nonce:
         return
-    exists = await NonceEvent.exists(db, {"self_id": my_id, "role": role, "peer_id": peer_id, "flow": "received", "nonce": nonce})
-    if not exists:
-        await NonceEvent.insert(db, self_id=my_id, role=role, peer_id=peer_id, flow="received", nonce=nonce)
+    if not await nonce_seen(role, peer_id, "received", nonce):
+        record_nonce(role, peer_id, "received", nonce)
 
 
-async def persist_crypto_meta(role: str, peer_id: str, **fields) -> None:
-    """Best-effort persistence; safe to leave enabled even if columns don't exist yet."""
+def crypto_meta_fields(**fields) -> dict:
+    """
+    Crypto metadata to merge into a RoleState update: {} when PERSIST_CRYPTO is off, and
+    only the columns role_state actually has. Handlers add the result to the update they
+    already issue, so persisting it costs no extra write.
+    """
     if not PERSIST_CRYPTO:
-        return
-    try:
-        await RoleState.update(
-            db,
-            where={"self_id": my_id, "role": role, "peer_id": peer_id},
-            fields=fields
-        )
-    except Exception as e:
-        # Column may not exist yet; keep silent to avoid breaking the demo.
-        # Enable debug below if you want to see it:
-        # client.logger.debug(f"[crypto:persist] skipped: {e}")
-        pass
+        return {}
+    return {k: v for k, v in fields.items() if k in role_state_columns}
+
+
+def persist_crypto_meta(role: str, peer_id: str, **fields) -> None:
+    """Best-effort persistence on its own, for paths with no RoleState update to merge into."""
+    fields = crypto_meta_fields(**fields)
+    if fields:
+        update_role_state(role, peer_id, fields=fields)
     
 
 async def get_peer_sign_pub(role: str, peer_id: str) -> Optional[str]:
     v = PEER_SIGN_PUB.get((role, peer_id))
     if v:
         return v
-    rows = await RoleState.find(
-        db,
-        where={"self_id": my_id, "role": role, "peer_id": peer_id},
-        fields=["peer_sign_pub"]
-    )
-    v = rows and rows[0].get("peer_sign_pub")
+    row = role_cache.get((role, peer_id))
+    v = row and row.get("peer_sign_pub")
     if v:
         PEER_SIGN_PUB[(role, peer_id)] = v
     return v
@@ -270,7 +379,7 @@ async def maybe_open_secure(role: str, peer_id: str, content: dict) -> None:
         obj = open_envelope(sym, peer, sec)
         if isinstance(obj, dict) and "message" in obj:
             content["message"] = obj["message"]
-            await persist_crypto_meta(role, peer_id, last_secure_at=_dt.datetime.now(_dt.timezone.utc).isoformat())
+            persist_crypto_meta(role, peer_id, last_secure_at=_dt.datetime.now(_dt.timezone.utc).isoformat())
             client.logger.info(f"[secure:{role}] opened message: {obj['message']!r}")
     except Exception as e:
         client.logger.warning(f"[secure:{role}] decrypt/verify failed: {e}")
@@ -300,35 +409,86 @@ Trigger = client_flow.triggers()
 
 """ ======================= ROLESTATE HELPERS (UTILS) ======================= """
 
+# RoleState rows by (role, peer_id), loaded in setup(). This process is the only writer of
+# its database file, so the cache is authoritative: handlers and send drivers read rows
+# here, and only a first contact with a peer reaches the table.
+role_cache: dict[tuple[str, str], dict] = {}
+
+# Debounced write-back. Changes collect per row in pending_role_fields; role_flusher waits
+# ROLE_FLUSH_WINDOW after the first one and writes them all with one bulk_update (one
+# commit), so a burst of changes to the same peer costs a single UPDATE.
+ROLE_FLUSH_WINDOW = 0.01  # seconds
+ROLE_FLUSH_RETRY = 1.0    # seconds before retrying a failed write-back
+pending_role_fields: dict[tuple[str, str], dict] = {}
+role_dirty_event = asyncio.Event()
+# Started on client.loop in __main__; shutdown() stops it.
+role_flusher_task: Optional[asyncio.Task] = None
+
+def update_role_state(role: str, peer_id: str, fields: dict) -> None:
+    """
+    Update the cached RoleState row for (role, peer_id) and queue the fields for
+    role_flusher. A peer with no cached row has no table row either: nothing to update.
+    """
+    row = role_cache.get((role, peer_id))
+    if row is None:
+        return
+    row.update(fields)
+    pending_role_fields.setdefault((role, peer_id), {}).update(fields)
+    role_dirty_event.set()
+
+async def flush_role_state() -> None:
+    """
+    Write every queued RoleState change, keyed on primary key, in one bulk_update (one
+    transaction). If the write fails, the fields go back into pending_role_fields under
+    any newer changes queued meanwhile, and the error is re-raised.
+    """
+    if not pending_role_fields:
+        return
+    batch = dict(pending_role_fields)
+    pending_role_fields.clear()
+    updates = [({"id": role_cache[key]["id"]}, fields) for key, fields in batch.items()]
+    try:
+        async with db.transaction():
+            await RoleState.bulk_update(db, updates)
+    except Exception:
+        for key, fields in batch.items():
+            pending_role_fields[key] = {**fields, **pending_role_fields.get(key, {})}
+        raise
+
+async def role_flusher() -> None:
+    """Write-behind loop for RoleState (scheduled on the client loop in __main__)."""
+    while True:
+        await role_dirty_event.wait()
+        await asyncio.sleep(ROLE_FLUSH_WINDOW)
+        role_dirty_event.clear()
+        try:
+            await flush_role_state()
+        except Exception:
+            client.logger.exception("[role_flusher] RoleState write-back failed; retrying")
+            role_dirty_event.set()
+            await asyncio.sleep(ROLE_FLUSH_RETRY)
+
 async def ensure_role_state(self_id: str, role: str, peer_id: str, default_state: str) -> dict:
     """
     Make sure we have a RoleState row for (self_id, role, peer_id).
-    If the 'state' is NULL, normalize it to default_state. Returns the row dict.
+    If the 'state' is NULL, normalize it to default_state. Returns a copy of the row dict,
+    so later writes do not change what the caller already read.
 
     Why:
       Receive handlers need consistent defaults to enforce nonce/ref invariants.
     """
-    rows = await RoleState.find(db, where={"self_id": self_id, "role": role, "peer_id": peer_id})
-    if rows:
-        row = rows[0]
-        if not row.get("state"):
-            await RoleState.update(db, where={"self_id": self_id, "role": role, "peer_id": peer_id}, fields={"state": default_state})
-            row["state"] = default_state
-        return row
-    await RoleState.insert(db, self_id=self_id, role=role, peer_id=peer_id, state=default_state)
-    return {
-        "self_id": self_id, 
-        "role": role, 
-        "peer_id": peer_id, 
-        "state": default_state,
-        "local_nonce": None, 
-        "peer_nonce": None, 
-        "local_reference": None, 
-        "peer_reference": None,
-        "exchange_count": 0, 
-        "finalize_retry_count": 0, 
-        "peer_address": None
-    }
+    row = role_cache.get((role, peer_id))
+    if row is None:
+        async with db.transaction():
+            row, _ = await RoleState.get_or_create(
+                db,
+                defaults={"state": default_state},
+                self_id=self_id, role=role, peer_id=peer_id,
+            )
+        row = role_cache.setdefault((role, peer_id), row)
+    if not row.get("state"):
+        update_role_state(role, peer_id, fields={"state": default_state})
+    return dict(row)
 
 
 
@@ -354,11 +514,11 @@ async def upload(payload: dict) -> dict[str, str]:
         return {}
 
     # Peer-scoped advertisement, e.g. {"initiator:<peer>": "...", "responder:<peer>": "..."}
-    init_rows = await RoleState.find(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id}, fields=["state"])
-    resp_rows = await RoleState.find(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id}, fields=["state"])
+    init_row = role_cache.get(("initiator", peer_id)) or {}
+    resp_row = role_cache.get(("responder", peer_id)) or {}
 
-    init_state = init_rows[0]["state"] if init_rows and init_rows[0]["state"] else "init_ready"
-    resp_state = resp_rows[0]["state"] if resp_rows and resp_rows[0]["state"] else "resp_ready"
+    init_state = init_row.get("state") or "init_ready"
+    resp_state = resp_row.get("state") or "resp_ready"
 
     client.logger.info(f"\033[92m[upload] peer={peer_id[:5]} | initiator={init_state} | responder={resp_state}\033[0m")
     return {f"initiator:{peer_id}": init_state, f"responder:{peer_id}": resp_state}
@@ -398,7 +558,7 @@ async def download(possible_states: dict[Optional[str], list[Node]]) -> None:
         if not target_state:
             continue
 
-        await RoleState.update(db, where={"self_id": my_id, "role": role, "peer_id": peer_id}, fields={"state": target_state})
+        update_role_state(role, peer_id, fields={"state": target_state})
         client.logger.info(f"[download] '{role}' set state -> '{target_state}' for {peer_id[:5]}")
 
 
@@ -461,23 +621,34 @@ async def handle_register(payload: dict) -> Optional[Event]:
     peer_id = content["from"]
 
     # Ensure a row for this conversation thread; refresh peer address for convenience.
-    row, created = await RoleState.get_or_create(
-        db,
-        defaults={"state": "resp_ready", "peer_address": addr},
-        self_id=my_id, role="responder", peer_id=peer_id,
-    )
+    row = role_cache.get(("responder", peer_id))
+    created = row is None
+    if created:
+        async with db.transaction():
+            row, _ = await RoleState.get_or_create(
+                db,
+                defaults={"state": "resp_ready", "peer_address": addr},
+                self_id=my_id, role="responder", peer_id=peer_id,
+            )
+        row = role_cache.setdefault(("responder", peer_id), row)
+    row = dict(row)
     if created:
         client.logger.info(f"[resp_ready -> resp_confirm] created role_state for peer={peer_id}")
-    else:
-        await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id}, fields={"peer_address": addr})
+    # An existing row gets its address refreshed, in the same write as any reconnect reset below.
+    fields = {} if created else {"peer_address": addr}
+
+    # Reconnect must present our last local_reference as their 'your_ref'
+    reconnect = content["intent"] == "reconnect" and "your_ref" in content and content["your_ref"] == row.get("local_reference")
+    if reconnect:
+        fields["local_reference"] = None
+    if fields:
+        update_role_state("responder", peer_id, fields=fields)
 
     if content["intent"] == "register" and content["to"] is None and row.get("local_reference") is None:
         client.logger.info(f"[resp_ready -> resp_confirm] REGISTER | peer_id={peer_id}")
         return Move(Trigger.ok)
 
-    # Reconnect must present our last local_reference as their 'your_ref'
-    if content["intent"] == "reconnect" and "your_ref" in content and content["your_ref"] == row.get("local_reference"):
-        await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id}, fields={"local_reference": None})
+    if reconnect:
         client.logger.info(f"[resp_ready -> resp_confirm] RECONNECT | peer_id={peer_id} under my_ref={row.get('local_reference')}")
         return Move(Trigger.ok)
 
@@ -508,12 +679,14 @@ async def handle_request(payload: dict) -> Optional[Event]:
     if row.get("local_nonce") != content["your_nonce"]:
         return Stay(Trigger.ignore)
     
-    seen_my_nonce = await NonceEvent.exists(db, {"self_id": my_id, "role": "responder", "peer_id": peer_id, "flow": "received", "nonce": content["my_nonce"]})
+    seen_my_nonce = await nonce_seen("responder", peer_id, "received", content["my_nonce"])
     if seen_my_nonce:
         client.logger.info(f"[resp_confirm -> resp_exchange] received my_nonce={content['my_nonce']!r} previously used")
         return Stay(Trigger.ignore)
 
     # ---[ CRYPTO ADDITIONS ]---
+    # Metadata from a valid hs is written with the RoleState update below.
+    crypto_meta = {}
     if "hs" in content:
         store = DBNonceStore(self_id=my_id, role="responder", peer_id=peer_id, ttl_seconds=60)
         try:
@@ -523,10 +696,10 @@ async def handle_request(payload: dict) -> Optional[Event]:
                 nonce_store=store, priv_kx=kx_priv
             )
             SYM_KEYS[("responder", peer_id)] = sym
+            ENV_NONCES[("responder", peer_id)] = gcm_nonce_sequence()
             PEER_SIGN_PUB[("responder", peer_id)] = content["hs"].get("sign_pub", "")
             client.logger.info(f"[resp_confirm -> resp_exchange] sym_key={sym[:8].hex()}...")
-            await persist_crypto_meta(
-                "responder", peer_id,
+            crypto_meta = crypto_meta_fields(
                 peer_sign_pub=content["hs"].get("sign_pub"),
                 peer_kx_pub=content["hs"].get("kx_pub"),
                 hs_derived_at=_dt.datetime.now(_dt.timezone.utc).isoformat()
@@ -534,14 +707,14 @@ async def handle_request(payload: dict) -> Optional[Event]:
         except Exception as e:
             client.logger.warning(f"[resp_confirm -> resp_exchange] handshake verify failed: {e}")
 
-    await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id},
-        fields={
+    update_role_state("responder", peer_id, fields={
             "peer_nonce": content["my_nonce"], 
             "local_nonce": None,
             "peer_reference": None,
             "local_reference": None,
             "exchange_count": 1, 
-            "peer_address": addr
+            "peer_address": addr,
+            **crypto_meta,
         }
     )
 
@@ -586,8 +759,7 @@ async def handle_request_or_conclude(payload: dict) -> Optional[Event]:
     await maybe_open_secure("responder", peer_id, content)
 
     if content["intent"] == "conclude":
-        await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id},
-            fields={
+        update_role_state("responder", peer_id, fields={
                 "peer_reference": content["my_ref"], 
                 "exchange_count": 0, 
                 "peer_address": addr
@@ -595,15 +767,14 @@ async def handle_request_or_conclude(payload: dict) -> Optional[Event]:
         client.logger.info("[resp_exchange -> resp_finalize] REQUEST TO CONCLUDE")
         return Move(Trigger.ok)
     
-    seen_my_nonce = await NonceEvent.exists(db, {"self_id": my_id, "role": "responder", "peer_id": peer_id, "flow": "received", "nonce": content["my_nonce"]})
+    seen_my_nonce = await nonce_seen("responder", peer_id, "received", content["my_nonce"])
     if seen_my_nonce:
         client.logger.info(f"[resp_exchange -> resp_finalize] received my_nonce={content['my_nonce']!r} previously used")
         return Stay(Trigger.ignore)
 
     # request (keep ping-pong going)
     new_count = int(row.get("exchange_count", 0)) + 1
-    await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id},
-        fields={
+    update_role_state("responder", peer_id, fields={
             "peer_nonce": content["my_nonce"], 
             "local_nonce": None, 
             "exchange_count": new_count, 
@@ -641,8 +812,7 @@ async def handle_close(payload: dict) -> Optional[Event]:
         if row.get("local_reference") != content["your_ref"]:
             return Stay(Trigger.ignore)
 
-        await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id},
-            fields={
+        update_role_state("responder", peer_id, fields={
                 "peer_reference": content["my_ref"],
                 "local_nonce": None,
                 "peer_nonce": None,
@@ -651,7 +821,7 @@ async def handle_close(payload: dict) -> Optional[Event]:
                 "peer_address": addr
             })
         # Clear per-peer nonce log after both refs present.
-        await NonceEvent.delete(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id})
+        await clear_nonces("responder", peer_id)
 
         client.logger.info(f"[resp_finalize -> resp_ready] CLOSE SUCCESS")
         return Move(Trigger.ok)
@@ -659,8 +829,7 @@ async def handle_close(payload: dict) -> Optional[Event]:
     # Retry path (we didn't see a valid 'close' yet).
     if int(row.get("finalize_retry_count", 0)) > RESP_FINAL_LIMIT:
         client.logger.warning("[resp_finalize -> resp_ready] FINALIZE RETRY LIMIT REACHED | FAILED TO CLOSE")
-        await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id},
-            fields={
+        update_role_state("responder", peer_id, fields={
                 "local_nonce": None, 
                 "peer_nonce": None,
                 "local_reference": None, 
@@ -672,7 +841,7 @@ async def handle_close(payload: dict) -> Optional[Event]:
         return Move(Trigger.error)
 
     new_retry = int(row.get("finalize_retry_count", 0)) + 1
-    await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id}, fields={"finalize_retry_count": new_retry, "peer_address": addr})
+    update_role_state("responder", peer_id, fields={"finalize_retry_count": new_retry, "peer_address": addr})
     return Stay(Trigger.ok)
 
 
@@ -702,6 +871,8 @@ async def handle_confirm(payload: dict) -> Optional[Event]:
     await ensure_role_state(my_id, "initiator", peer_id, "init_ready")
 
     # ---[ CRYPTO ADDITIONS ]---
+    # Metadata from a valid hs is written with the RoleState update below.
+    crypto_meta = {}
     # If responder attached a signed handshake blob, validate & derive sym key.
     if "hs" in content:
         store = DBNonceStore(self_id=my_id, role="initiator", peer_id=peer_id, ttl_seconds=60)
@@ -712,10 +883,10 @@ async def handle_confirm(payload: dict) -> Optional[Event]:
                 nonce_store=store, priv_kx=kx_priv
             )
             SYM_KEYS[("initiator", peer_id)] = sym
+            ENV_NONCES[("initiator", peer_id)] = gcm_nonce_sequence()
             PEER_SIGN_PUB[("initiator", peer_id)] = content["hs"].get("sign_pub", "")
             client.logger.info(f"[init_ready -> init_exchange] sym_key={sym[:8].hex()}...")
-            await persist_crypto_meta(
-                "initiator", peer_id,
+            crypto_meta = crypto_meta_fields(
                 peer_sign_pub=content["hs"].get("sign_pub"),
                 peer_kx_pub=content["hs"].get("kx_pub"),
                 hs_derived_at=_dt.datetime.now(_dt.timezone.utc).isoformat()
@@ -723,14 +894,14 @@ async def handle_confirm(payload: dict) -> Optional[Event]:
         except Exception as e:
             client.logger.warning(f"[init_ready -> init_exchange] handshake verify failed: {e}")
 
-    await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id},
-        fields={
+    update_role_state("initiator", peer_id, fields={
             "peer_nonce": content["my_nonce"], 
             "exchange_count": 0,
             "local_nonce": None,
             "peer_reference": None,
             "local_reference": None,
-            "peer_address": addr
+            "peer_address": addr,
+            **crypto_meta,
         })
     
     # Record responder's my_nonce exactly once (validator may have already recorded it)
@@ -767,7 +938,7 @@ async def handle_respond(payload: dict) -> Optional[Event]:
     if row.get("local_nonce") != content["your_nonce"]:
         return Stay(Trigger.ignore)
 
-    seen_my_nonce = await NonceEvent.exists(db, {"self_id": my_id, "role": "initiator", "peer_id": peer_id, "flow": "received", "nonce": content["my_nonce"]})
+    seen_my_nonce = await nonce_seen("initiator", peer_id, "received", content["my_nonce"])
     if seen_my_nonce:
         client.logger.info(f"[init_exchange -> init_finalize_propose] received my_nonce={content['my_nonce']!r} previously used")
         return Stay(Trigger.ignore)
@@ -777,13 +948,13 @@ async def handle_respond(payload: dict) -> Optional[Event]:
 
     if int(row.get("exchange_count", 0)) > EXCHANGE_LIMIT:
         # CUT: accept their nonce but reset the counter, then progress to finalize
-        await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id}, fields={"peer_nonce": content["my_nonce"], "local_nonce": None, "peer_address": addr})
+        update_role_state("initiator", peer_id, fields={"peer_nonce": content["my_nonce"], "local_nonce": None, "peer_address": addr})
         await record_received_nonce_once("initiator", peer_id, content["my_nonce"])
         client.logger.info(f"[init_exchange -> init_finalize_propose] EXCHANGE CUT (limit reached)")
         return Move(Trigger.ok)
 
     # Normal exchange: store their nonce and clear ours (we'll generate a new one when we send)
-    await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id}, fields={"peer_nonce": content["my_nonce"], "local_nonce": None, "peer_address": addr})
+    update_role_state("initiator", peer_id, fields={"peer_nonce": content["my_nonce"], "local_nonce": None, "peer_address": addr})
     await record_received_nonce_once("initiator", peer_id, content["my_nonce"])
     client.logger.info(f"[init_exchange -> init_finalize_propose] GOT RESPONSE #{row.get('exchange_count', 0)}")
     return Stay(Trigger.ok)
@@ -814,13 +985,12 @@ async def handle_finish(payload: dict) -> Optional[Event]:
         return Stay(Trigger.ignore)
 
     # Success: we now know the responder's ref; clear the transient nonce log.
-    await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id}, 
-            fields={
+    update_role_state("initiator", peer_id, fields={
                 "peer_reference": content["my_ref"], 
                 "finalize_retry_count": 0, 
                 "peer_address": addr
             })
-    await NonceEvent.delete(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id})
+    await clear_nonces("initiator", peer_id)
     client.logger.info("[init_finalize_propose -> init_finalize_close] CLOSE")
     return Move(Trigger.ok)
 
@@ -839,8 +1009,7 @@ async def finish_to_idle(payload: dict) -> Optional[Event]:
 
     row = await ensure_role_state(my_id, "initiator", peer_id, "init_ready")
     if int(row.get("finalize_retry_count", 0)) > INIT_FINAL_LIMIT:
-        await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id},
-            fields={
+        update_role_state("initiator", peer_id, fields={
                 "local_nonce": None,
                 "peer_nonce": None,
                 # keep local_reference / peer_reference
@@ -875,9 +1044,9 @@ async def tick_background_sender() -> list[dict]:
     await asyncio.sleep(1)
     payloads = []
 
-    # iterate all known peers for both roles (multi-peer)
-    init_rows = await RoleState.find(db, where={"self_id": my_id, "role": "initiator"})
-    resp_rows = await RoleState.find(db, where={"self_id": my_id, "role": "responder"})
+    # iterate all known peers for both roles (multi-peer); copies, as the loops write rows
+    init_rows = [dict(r) for (role, _), r in role_cache.items() if role == "initiator"]
+    resp_rows = [dict(r) for (role, _), r in role_cache.items() if role == "responder"]
 
     # ---------------------------- Initiator role ----------------------------
     for row in init_rows:
@@ -897,8 +1066,7 @@ async def tick_background_sender() -> list[dict]:
                 continue
             # Send close repeatedly until counter exceeded FINAL_LIMIT.
             if int(row.get("finalize_retry_count", 0)) > INIT_FINAL_LIMIT:
-                await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id},
-                    fields={
+                update_role_state("initiator", peer_id, fields={
                         "local_nonce": None,
                         "peer_nonce": None,
                         # keep local_reference / peer_reference
@@ -909,7 +1077,7 @@ async def tick_background_sender() -> list[dict]:
                 client.logger.info("[init_finalize_close -> init_ready] CUT (refs preserved)")
             else:
                 new_retry = int(row.get("finalize_retry_count", 0)) + 1
-                await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id}, fields={"finalize_retry_count": new_retry})
+                update_role_state("initiator", peer_id, fields={"finalize_retry_count": new_retry})
                 client.logger.info(f"[send][initiator:{role_state}] close #{new_retry} | your_ref={row.get('peer_reference')}")
                 payload = {
                     "to": peer_id,
@@ -933,7 +1101,7 @@ async def tick_background_sender() -> list[dict]:
                 continue
             # provide our reference; initiator will later 'close'
             local_ref = row.get("local_reference") or generate_reference()
-            await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id}, fields={"local_reference": local_ref})
+            update_role_state("responder", peer_id, fields={"local_reference": local_ref})
             client.logger.info(f"[send][responder:{role_state}] finish #{row.get('finalize_retry_count', 0)} | my_ref={local_ref}")
             payload = {
                 "to": peer_id,
@@ -969,9 +1137,9 @@ async def queued_sender() -> list[dict]:
     await asyncio.sleep(1)
     payloads = []
 
-    # iterate all known peers for both roles (multi-peer)
-    init_rows = await RoleState.find(db, where={"self_id": my_id, "role": "initiator"})
-    resp_rows = await RoleState.find(db, where={"self_id": my_id, "role": "responder"})
+    # iterate all known peers for both roles (multi-peer); copies, as the loops write rows
+    init_rows = [dict(r) for (role, _), r in role_cache.items() if role == "initiator"]
+    resp_rows = [dict(r) for (role, _), r in role_cache.items() if role == "responder"]
 
     # ---------------------------- Initiator role ----------------------------
     for row in init_rows:
@@ -987,8 +1155,8 @@ async def queued_sender() -> list[dict]:
             # bump the exchange counter and emit a new nonce
             new_cnt = int(row.get("exchange_count", 0)) + 1
             local_nonce = row.get("local_nonce") or generate_nonce()
-            await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id}, fields={"local_nonce": local_nonce, "exchange_count": new_cnt})
-            await NonceEvent.insert(db, self_id=my_id, role="initiator", peer_id=peer_id, flow="sent", nonce=local_nonce)
+            update_role_state("initiator", peer_id, fields={"local_nonce": local_nonce, "exchange_count": new_cnt})
+            record_nonce("initiator", peer_id, "sent", local_nonce)
             client.logger.info(f"[send][initiator:{role_state}] request #{new_cnt} | my_nonce={local_nonce}")
             payload = {
                 "to": peer_id,
@@ -999,14 +1167,14 @@ async def queued_sender() -> list[dict]:
             }
             # Attach an "init" signed handshake only on our first request in the cycle (new_cnt == 1).
             if new_cnt == 1:
-                payload["hs"] = build_handshake_message("init", local_nonce, kx_priv, sign_priv)
+                payload["hs"] = build_handshake_message("init", local_nonce, kx_priv, sign_priv, KX_PUB_B64, SIGN_PUB_B64)
 
             # ---[ CRYPTO ADDITIONS ]---
             # If we already have a symmetric key for this peer, seal the message.
             sym = SYM_KEYS.get(("initiator", peer_id))
             if sym and "message" in payload:
                 msg_obj = {"message": payload.pop("message")}
-                payload["sec"] = seal_envelope(sym, sign_priv, msg_obj)
+                payload["sec"] = seal_envelope(sym, sign_priv, msg_obj, ENV_NONCES.get(("initiator", peer_id)))
 
         elif role_state == "init_finalize_propose":
             # guard: need peer_nonce for your_nonce in conclude
@@ -1016,7 +1184,7 @@ async def queued_sender() -> list[dict]:
             # propose our reference and keep retry count for the close step
             new_retry = int(row.get("finalize_retry_count", 0)) + 1
             local_ref = row.get("local_reference") or generate_reference()
-            await RoleState.update(db, where={"self_id": my_id, "role": "initiator", "peer_id": peer_id}, fields={"local_reference": local_ref, "finalize_retry_count": new_retry})
+            update_role_state("initiator", peer_id, fields={"local_reference": local_ref, "finalize_retry_count": new_retry})
             client.logger.info(f"[send][initiator:{role_state}] conclude #{new_retry} | my_ref={local_ref}")
             payload = {
                 "to": peer_id,
@@ -1036,12 +1204,12 @@ async def queued_sender() -> list[dict]:
         if role_state == "resp_confirm":
             # send our confirm with a nonce the initiator must echo as 'your_nonce'
             local_nonce = row.get("local_nonce") or generate_nonce()
-            await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id}, fields={"local_nonce": local_nonce})
-            await NonceEvent.insert(db, self_id=my_id, role="responder", peer_id=peer_id, flow="sent", nonce=local_nonce)
+            update_role_state("responder", peer_id, fields={"local_nonce": local_nonce})
+            record_nonce("responder", peer_id, "sent", local_nonce)
             client.logger.info(f"[send][responder:{role_state}] confirm | my_nonce={local_nonce}")
             payload = {"to": peer_id, "intent": "confirm", "my_nonce": local_nonce}
             # Attach a "response" signed handshake on our confirm.
-            payload["hs"] = build_handshake_message("response", local_nonce, kx_priv, sign_priv)
+            payload["hs"] = build_handshake_message("response", local_nonce, kx_priv, sign_priv, KX_PUB_B64, SIGN_PUB_B64)
 
         elif role_state == "resp_exchange":
             # guard: need peer_nonce to populate your_nonce
@@ -1050,8 +1218,8 @@ async def queued_sender() -> list[dict]:
                 continue
             # respond with a fresh nonce each round
             local_nonce = row.get("local_nonce") or generate_nonce()
-            await RoleState.update(db, where={"self_id": my_id, "role": "responder", "peer_id": peer_id}, fields={"local_nonce": local_nonce})
-            await NonceEvent.insert(db, self_id=my_id, role="responder", peer_id=peer_id, flow="sent", nonce=local_nonce)
+            update_role_state("responder", peer_id, fields={"local_nonce": local_nonce})
+            record_nonce("responder", peer_id, "sent", local_nonce)
             client.logger.info(f"[send][responder:{role_state}] respond #{row.get('exchange_count', 0)} | my_nonce={local_nonce}")
             payload = {
                 "to": peer_id,
@@ -1065,7 +1233,7 @@ async def queued_sender() -> list[dict]:
             sym = SYM_KEYS.get(("responder", peer_id))
             if sym and "message" in payload:
                 msg_obj = {"message": payload.pop("message")}
-                payload["sec"] = seal_envelope(sym, sign_priv, msg_obj)
+                payload["sec"] = seal_envelope(sym, sign_priv, msg_obj, ENV_NONCES.get(("responder", peer_id)))
 
         if payload is not None:
             payloads.append(payload)
@@ -1083,8 +1251,14 @@ if __name__ == "__main__":
 
     # Ensure DB schema before client loop starts.
     client.loop.run_until_complete(setup())
+    role_flusher_task = client.loop.create_task(role_flusher())
 
     try:
         client.run(host="127.0.0.1", port=8888, config_path=args.config_path or "configs/client_config.json")
     finally:
-        asyncio.run(db.close())
+        # Drain on the loop that owns the DB connection and the flush tasks; a fresh
+        # loop is only used if the client already closed its own.
+        if client.loop.is_closed():
+            asyncio.run(shutdown())
+        else:
+            client.loop.run_until_complete(shutdown())
@@ -28,15 +28,17 @@ NOTE: For production-grade deployments, you should:
     - Consider transcript/channel binding for stronger handshake integrity
 """
 import os
-import base64
 import datetime
+import secrets
+import functools
+import hmac
 import json
 import inspect
-from typing import Union, Any, Optional
+from binascii import a2b_base64, b2a_base64
+from typing import Union, Any, Iterator, Optional
 
 from cryptography.hazmat.primitives.asymmetric import x25519, ed25519
 from cryptography.hazmat.primitives import serialization, hashes
-from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
 
@@ -44,14 +46,17 @@ from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
 # Base64 helpers
 # ------------------------
 
+# These sit on every handshake and envelope, so they call the binascii C functions
+# directly (what base64.b64encode/b64decode wrap) and skip the Python-level wrappers.
+
 def b64_encode(data: bytes) -> str:
     """Encode bytes to Base64 string."""
-    return base64.b64encode(data).decode("utf-8")
+    return b2a_base64(data, newline=False).decode("ascii")
 
 
 def b64_decode(data: str) -> bytes:
     """Decode Base64 string to bytes."""
-    return base64.b64decode(data.encode("utf-8"))
+    return a2b_base64(data)
 
 
 # ------------------------
@@ -73,6 +78,11 @@ def serialize_public_key(
 # KDF and signatures
 # ------------------------
 
+# HKDF-SHA256 (RFC 5869) with salt=None, info=b"handshake", length=32: the salt
+# defaults to 32 zero bytes and 32 bytes of output is the single expand block T(1).
+_HKDF_SALT = b"\x00" * 32
+_HKDF_INFO_T1 = b"handshake\x01"
+
 def derive_symmetric_key(
     priv_key: x25519.X25519PrivateKey,
     peer_pub_b64: str
@@ -82,13 +92,9 @@ def derive_symmetric_key(
     shared = priv_key.exchange(
         x25519.X25519PublicKey.from_public_bytes(peer_raw)
     )
-    hkdf = HKDF(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=None,
-        info=b"handshake",
-    )
-    return hkdf.derive(shared)
+    # Extract + one-block expand with hmac, instead of building an HKDF object per derive.
+    prk = hmac.digest(_HKDF_SALT, shared, "sha256")
+    return hmac.digest(prk, _HKDF_INFO_T1, "sha256")
 
 
 def sign_payload(
@@ -100,16 +106,18 @@ def sign_payload(
     return b64_encode(sig)
 
 
+@functools.lru_cache(maxsize=1024)
+def _verify_key(pub_sign_b64: str) -> ed25519.Ed25519PublicKey:
+    """Parse a peer's Ed25519 public key once; peers keep the same key across messages."""
+    return ed25519.Ed25519PublicKey.from_public_bytes(b64_decode(pub_sign_b64))
+
 def verify_payload(
     pub_sign_b64: str,
     data: bytes,
     sig_b64: str
 ) -> bool:
     """Verify an Ed25519 signature. Raises on failure; returns True on success."""
-    raw_pub = b64_decode(pub_sign_b64)
-    raw_sig = b64_decode(sig_b64)
-    verify_key = ed25519.Ed25519PublicKey.from_public_bytes(raw_pub)
-    verify_key.verify(raw_sig, data)
+    _verify_key(pub_sign_b64).verify(b64_decode(sig_b64), data)
     return True
 
 
@@ -121,16 +129,24 @@ def build_handshake_message(
     msg_type: str,                      # "init" or "response"
     nonce: str,                         # the peer must echo/expect this
     priv_kx: x25519.X25519PrivateKey,   # our X25519 private key
-    priv_sign: ed25519.Ed25519PrivateKey
+    priv_sign: ed25519.Ed25519PrivateKey,
+    kx_pub_b64: Optional[str] = None,   # serialize_public_key(priv_kx.public_key()), if cached
+    sign_pub_b64: Optional[str] = None  # serialize_public_key(priv_sign.public_key()), if cached
 ) -> dict:
     """
     Construct a signed handshake message with:
       - type, nonce, kx_pub, sign_pub, timestamp, sig
     Signature covers: f"{nonce}|{kx_pub_b64}|{timestamp}"
+
+    The public keys never change for an identity, so callers that send many handshakes
+    should serialize them once and pass kx_pub_b64 / sign_pub_b64; otherwise they are
+    derived from the private keys on each call.
     """
-    ts = datetime.datetime.now().replace(microsecond=0).isoformat()
-    kx_pub_b64 = serialize_public_key(priv_kx.public_key())
-    sign_pub_b64 = serialize_public_key(priv_sign.public_key())
+    ts = datetime.datetime.now().isoformat(timespec="seconds")
+    if kx_pub_b64 is None:
+        kx_pub_b64 = serialize_public_key(priv_kx.public_key())
+    if sign_pub_b64 is None:
+        sign_pub_b64 = serialize_public_key(priv_sign.public_key())
 
     payload = f"{nonce}|{kx_pub_b64}|{ts}".encode("utf-8")
     sig_b64 = sign_payload(priv_sign, payload)
@@ -199,35 +215,59 @@ async def validate_handshake_message(
 # Secure envelope sealer & opener
 # ------------------------
 
-def seal_envelope(sym_key: bytes, sign_priv: ed25519.Ed25519PrivateKey, obj: dict) -> dict:
+_ENV_AAD = b"HSAgent.envelope.v1"  # associated data bound into every envelope's AES-GCM
+
+def gcm_nonce_sequence(limit: int = 2**32) -> Iterator[bytes]:
+    """
+    Deterministic 12-byte AES-GCM nonces for one sender and session key: a random 8-byte
+    prefix (drawn once) followed by a 4-byte big-endian counter. Keep one sequence per
+    (key, sender) and pass it to seal_envelope; it stops after `limit` nonces (at most
+    2**32), after which seal_envelope refuses to encrypt until a new key is agreed.
+    """
+    if not 0 < limit <= 2**32:
+        raise ValueError("limit must be in 1..2**32")
+    prefix = os.urandom(8)
+    return (prefix + i.to_bytes(4, "big") for i in range(limit))
+
+def seal_envelope(
+    sym_key: bytes,
+    sign_priv: ed25519.Ed25519PrivateKey,
+    obj: dict,
+    nonces: Optional[Iterator[bytes]] = None,
+) -> dict:
     """
     AEAD-encrypt + sign an application payload.
-    - Computes SHA-256 over the plaintext (associated data)
-    - Encrypts with AES-GCM using a fresh 12-byte nonce
+    - Encrypts with AES-GCM using a fresh 12-byte nonce and the fixed associated data _ENV_AAD
+      (the next one from `nonces`, see gcm_nonce_sequence(), or a random one)
     - Signs the JSON envelope with Ed25519
     Returns: {"envelope": {...}, "sig": "<b64>"}
+    Raises RuntimeError once `nonces` is exhausted: the session needs a new key.
     """
     plaintext = json.dumps(obj, separators=(",", ":"), sort_keys=True).encode("utf-8")
 
-    # SHA-256 fingerprint of plaintext (used as AEAD associated data)
-    h = hashes.Hash(hashes.SHA256())
-    h.update(plaintext)
-    fingerprint = h.finalize()
-
     aes = AESGCM(sym_key)
-    # 12-byte nonce for AES-GCM; caller can choose different nonce strategy if desired
-    import secrets as _secrets
-    nonce = _secrets.token_bytes(12)
+    # 12-byte nonce for AES-GCM; a counter sequence avoids an os.urandom call per envelope
+    if nonces is not None:
+        nonce = next(nonces, None)
+        if nonce is None:
+            raise RuntimeError("AES-GCM nonce sequence exhausted; re-key required")
+    else:
+        nonce = secrets.token_bytes(12)
 
-    ciphertext = aes.encrypt(nonce, plaintext, associated_data=fingerprint)
+    ciphertext = aes.encrypt(nonce, plaintext, associated_data=_ENV_AAD)
 
+    nonce_b64 = b64_encode(nonce)
+    ciphertext_b64 = b64_encode(ciphertext)
+    ts = datetime.datetime.now().isoformat(timespec="seconds")
     envelope = {
-        "nonce": b64_encode(nonce),
-        "ciphertext": b64_encode(ciphertext),
-        "hash": b64_encode(fingerprint),
-        "ts": datetime.datetime.now().replace(microsecond=0).isoformat(),
+        "nonce": nonce_b64,
+        "ciphertext": ciphertext_b64,
+        "ts": ts,
     }
-    env_bytes = json.dumps(envelope, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    # Same bytes as json.dumps(envelope, separators=(",", ":"), sort_keys=True), which
+    # open_envelope recomputes: the keys are fixed and emitted in sorted order, and the
+    # values are Base64 / ISO-8601, which need no JSON escaping.
+    env_bytes = f'{{"ciphertext":"{ciphertext_b64}","nonce":"{nonce_b64}","ts":"{ts}"}}'.encode("ascii")
     sig_b64 = b64_encode(sign_priv.sign(env_bytes))
     return {"envelope": envelope, "sig": sig_b64}
 
@@ -236,8 +276,9 @@ def open_envelope(sym_key: bytes, peer_sign_pub_b64: str, signed: dict) -> dict:
     """
     Verify + decrypt an application envelope produced by seal_envelope().
     - Verifies Ed25519 signature over the JSON envelope
-    - Decrypts with AES-GCM using the embedded nonce and associated-data hash
-    - Verifies the SHA-256 fingerprint matches the decrypted plaintext
+    - Decrypts with AES-GCM using the embedded nonce and _ENV_AAD
+    - Envelopes from older peers still carry "hash" (SHA-256 of the plaintext, used as the
+      associated data); those are decrypted with it and the fingerprint is re-checked
     Returns the decoded dict payload.
     """
     envelope = signed.get("envelope", {})
@@ -248,15 +289,18 @@ def open_envelope(sym_key: bytes, peer_sign_pub_b64: str, signed: dict) -> dict:
 
     nonce = b64_decode(envelope["nonce"])
     ciphertext = b64_decode(envelope["ciphertext"])
-    fingerprint = b64_decode(envelope["hash"])
 
     aes = AESGCM(sym_key)
-    plaintext = aes.decrypt(nonce, ciphertext, associated_data=fingerprint)
+    if "hash" not in envelope:
+        plaintext = aes.decrypt(nonce, ciphertext, associated_data=_ENV_AAD)
+    else:
+        fingerprint = b64_decode(envelope["hash"])
+        plaintext = aes.decrypt(nonce, ciphertext, associated_data=fingerprint)
 
-    h = hashes.Hash(hashes.SHA256())
-    h.update(plaintext)
-    if h.finalize() != fingerprint:
-        raise ValueError("Hash mismatch after decrypt")
+        h = hashes.Hash(hashes.SHA256())
+        h.update(plaintext)
+        if not hmac.compare_digest(h.finalize(), fingerprint):
+            raise ValueError("Hash mismatch after decrypt")
 
     return json.loads(plaintext.decode("utf-8"))
 
@@ -283,7 +327,7 @@ def save_identity_json(
 
     doc = {
         "my_id": my_id,
-        "created_at": datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0).isoformat() + "Z",
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds") + "Z",
         "kx_pub_b64": b64_encode(kx_pub_raw),
         "sign_pub_b64": b64_encode(sign_pub_raw),
     }
@@ -363,12 +407,40 @@ def load_identity_json(
 _ID_FILE_VERSION = "id.v1"
 _ID_AAD = b"HSAgent.identity.v1"  # associated data bound into AES-GCM
 
-def _kdf_scrypt(password: bytes, salt: bytes) -> bytes:
+# scrypt cost for newly saved files. Each file records the parameters it was sealed
+# with, so these can be raised later without breaking older files.
+_SCRYPT_N = 2**14
+_SCRYPT_R = 8
+_SCRYPT_P = 1
+
+# Upper bounds for parameters read back from a file, so a crafted identity file cannot make
+# load spend unbounded CPU or memory in scrypt (which needs about 128 * n * r bytes).
+_SCRYPT_MAX_N = 2**20
+_SCRYPT_MAX_R = 32
+_SCRYPT_MAX_P = 16
+_SCRYPT_MAX_MEM = 256 * 1024 * 1024
+
+def _check_scrypt_params(n: Any, r: Any, p: Any) -> None:
+    """Raise ValueError unless n/r/p are sane scrypt parameters within the bounds above."""
+    if not all(isinstance(v, int) and not isinstance(v, bool) for v in (n, r, p)):
+        raise ValueError("Invalid scrypt parameters in identity file")
+    if (
+        not (2 <= n <= _SCRYPT_MAX_N and n & (n - 1) == 0)
+        or not 1 <= r <= _SCRYPT_MAX_R
+        or not 1 <= p <= _SCRYPT_MAX_P
+        or 128 * n * r > _SCRYPT_MAX_MEM
+    ):
+        raise ValueError("Invalid scrypt parameters in identity file")
+
+@functools.lru_cache(maxsize=4)
+def _kdf_scrypt(password: bytes, salt: bytes, n: int = _SCRYPT_N, r: int = _SCRYPT_R, p: int = _SCRYPT_P) -> bytes:
     """
     Derive a 32-byte key from a password using scrypt.
     n=2**14 is a good interactive default; adjust r/p for your environment.
+    Results are cached in memory for the process lifetime, so re-loading the same
+    identity file does not pay for scrypt again.
     """
-    kdf = Scrypt(salt=salt, length=32, n=2**14, r=8, p=1)
+    kdf = Scrypt(salt=salt, length=32, n=n, r=r, p=p)
     return kdf.derive(password)
 
 def save_identity_json_encrypted(
@@ -401,8 +473,7 @@ def save_identity_json_encrypted(
     # 2) Build the plaintext JSON (small, stable schema)
     plaintext_obj = {
         "my_id": my_id,
-        "created_at": datetime.datetime.now(datetime.timezone.utc)\
-            .replace(microsecond=0).isoformat(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
         "kx_priv_b64":   b64_encode(kx_priv_raw),
         "kx_pub_b64":    b64_encode(kx_pub_raw),
         "sign_priv_b64": b64_encode(sign_priv_raw),
@@ -412,7 +483,8 @@ def save_identity_json_encrypted(
 
     # 3) Derive key and seal with AES-GCM
     salt  = os.urandom(16)
-    key   = _kdf_scrypt(password, salt)
+    # Same positional form as load_identity_json_encrypted, so both share the lru_cache entry.
+    key   = _kdf_scrypt(password, salt, _SCRYPT_N, _SCRYPT_R, _SCRYPT_P)
     aes   = AESGCM(key)
     nonce = os.urandom(12)
     ct    = aes.encrypt(nonce, plaintext, associated_data=_ID_AAD)
@@ -421,6 +493,9 @@ def save_identity_json_encrypted(
     doc = {
         "v": _ID_FILE_VERSION,
         "kdf": "scrypt",
+        "n": _SCRYPT_N,
+        "r": _SCRYPT_R,
+        "p": _SCRYPT_P,
         "salt": b64_encode(salt),
         "nonce": b64_encode(nonce),
         "aad": b64_encode(_ID_AAD),
@@ -441,7 +516,10 @@ def load_identity_json_encrypted(path: str, password: bytes):
     aad   = b64_decode(doc["aad"])
     ct    = b64_decode(doc["ciphertext"])
 
-    key = _kdf_scrypt(password, salt)
+    # Files written before the parameters were recorded used the defaults.
+    n, r, p = doc.get("n", _SCRYPT_N), doc.get("r", _SCRYPT_R), doc.get("p", _SCRYPT_P)
+    _check_scrypt_params(n, r, p)
+    key = _kdf_scrypt(password, salt, n, r, p)
     aes = AESGCM(key)
     plaintext = aes.decrypt(nonce, ct, associated_data=aad)
 
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Checks for the secure envelope nonce sequence in crypto_utils.py.
+Run from this directory: python test_crypto_utils.py
+"""
+
+import os
+
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from crypto_utils import gcm_nonce_sequence, seal_envelope, open_envelope, serialize_public_key
+
+
+def test_nonce_sequence_exhaustion():
+    """A sequence seals exactly `limit` envelopes, then asks for a new key"""
+    print("🧪 Testing nonce sequence exhaustion...")
+
+    sym_key = os.urandom(32)
+    sign_priv = ed25519.Ed25519PrivateKey.generate()
+    sign_pub = serialize_public_key(sign_priv.public_key())
+    nonces = gcm_nonce_sequence(limit=3)
+
+    seen = set()
+    for i in range(3):
+        signed = seal_envelope(sym_key, sign_priv, {"i": i}, nonces)
+        assert open_envelope(sym_key, sign_pub, signed) == {"i": i}
+        seen.add(signed["envelope"]["nonce"])
+    assert len(seen) == 3
+
+    try:
+        seal_envelope(sym_key, sign_priv, {"i": 3}, nonces)
+        assert False, "Should have raised RuntimeError for an exhausted sequence"
+    except RuntimeError as e:
+        assert "re-key required" in str(e)
+
+    # Still exhausted on the next call: no nonce is ever reused
+    try:
+        seal_envelope(sym_key, sign_priv, {"i": 4}, nonces)
+        assert False, "Should have raised RuntimeError for an exhausted sequence"
+    except RuntimeError:
+        pass
+
+    # Without a sequence, random nonces are used and never run out
+    signed = seal_envelope(sym_key, sign_priv, {"i": 5})
+    assert open_envelope(sym_key, sign_pub, signed) == {"i": 5}
+
+    for bad in (0, 2**32 + 1):
+        try:
+            gcm_nonce_sequence(limit=bad)
+            assert False, "Should have raised ValueError for an out-of-range limit"
+        except ValueError:
+            pass
+
+    print("✅ Nonce sequence exhaustion test passed!")
+
+
+def test_exhaustion_inside_generator():
+    """Exhaustion surfaces as the explicit error, not StopIteration, inside a generator"""
+    print("🧪 Testing exhaustion inside a generator...")
+
+    sym_key = os.urandom(32)
+    sign_priv = ed25519.Ed25519PrivateKey.generate()
+    nonces = gcm_nonce_sequence(limit=1)
+
+    def sealer():
+        while True:
+            yield seal_envelope(sym_key, sign_priv, {"m": "x"}, nonces)
+
+    gen = sealer()
+    next(gen)
+    try:
+        next(gen)
+        assert False, "Should have raised RuntimeError for an exhausted sequence"
+    except RuntimeError as e:
+        assert "re-key required" in str(e)
+
+    print("✅ Exhaustion inside a generator test passed!")
+
+
+def main():
+    """Run all tests"""
+    test_nonce_sequence_exhaustion()
+    test_exhaustion_inside_generator()
+    print("\n🎉 All crypto_utils checks passed!")
+
+
+if __name__ == "__main__":
+    main()
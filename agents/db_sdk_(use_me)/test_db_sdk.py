@@ -11,7 +11,7 @@ from pathlib import Path
 # Copy the db_sdk code here (you will need to paste your updated db_sdk.py content)
 # For now, we assume it is imported
 try:
-    from db_sdk import Database, Model, Field
+    from db_sdk import Database, Model, Field, _STMT_CACHE_SIZE
 except ImportError:
     print("Please ensure db_sdk.py is in the same directory or Python path")
     print("You can copy the content from your updated db_sdk.py file")
@@ -454,6 +454,318 @@ async def test_exists():
     print("✅ exists test passed!")
 
 
+async def test_statement_cache():
+    """Test that cached SQL text is reused per statement shape with fresh parameters"""
+    print("🧪 Testing statement cache...")
+
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        db_path = Path(tmp.name)
+
+    class Item(Model):
+        __tablename__ = "cached_items"
+        id   = Field("INTEGER", primary_key=True)
+        name = Field("TEXT")
+        qty  = Field("INTEGER", default=0)
+
+    db = Database(db_path)
+    await Item.create_table(db)
+
+    for name, qty in [("foo", 1), ("bar", 2), ("baz", 3)]:
+        await Item.insert(db, name=name, qty=qty)
+
+    # Same shape, different values -> same SQL text, correct rows each time
+    assert [r["qty"] for r in await Item.find(db, where={"name": "foo"})] == [1]
+    assert [r["qty"] for r in await Item.find(db, where={"name": "bar"})] == [2]
+    find_keys = [k for k in db._stmt_cache if k[0] == "find"]
+    assert len(find_keys) == 1, find_keys
+
+    # IN lists of different lengths are distinct shapes
+    rows = await Item.find(db, where={"name__in": ["foo", "bar"]}, order_by="qty")
+    assert [r["name"] for r in rows] == ["foo", "bar"]
+    rows = await Item.find(db, where={"name__in": ["baz"]})
+    assert [r["name"] for r in rows] == ["baz"]
+    assert len([k for k in db._stmt_cache if k[0] == "find"]) == 3
+
+    # Updates reuse the cached statement as well
+    await Item.update(db, where={"name": "foo"}, fields={"qty": 10})
+    await Item.update(db, where={"name": "bar"}, fields={"qty": 20})
+    assert len([k for k in db._stmt_cache if k[0] == "update"]) == 1
+    rows = await Item.find(db, where={"qty__gte": 10}, order_by="qty")
+    assert [(r["name"], r["qty"]) for r in rows] == [("foo", 10), ("bar", 20)]
+
+    # Invalid fields still raise and are not cached
+    try:
+        await Item.find(db, where={"invalid_field": 1})
+        assert False, "Should have raised ValueError for invalid field"
+    except ValueError as e:
+        assert "Unknown fields for Item" in str(e)
+    assert not any(k[3] == (("invalid_field", None),) for k in db._stmt_cache if k[0] == "find")
+
+    # The cache is bounded; the least recently used shapes are evicted first
+    hot_key = find_keys[0]
+    for n in range(1, 200):
+        await Item.find(db, where={"name__in": ["foo"] * n})
+        await Item.find(db, where={"name": "foo"})
+    assert len(db._stmt_cache) == _STMT_CACHE_SIZE
+    assert hot_key in db._stmt_cache
+    assert not any(k[3] == (("name__in", 1),) for k in db._stmt_cache if k[0] == "find")
+
+    await db.close()
+    db_path.unlink()
+    print("✅ Statement cache test passed!")
+
+
+async def test_transaction():
+    """Test grouping several writes into one transaction"""
+    print("🧪 Testing transaction...")
+
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        db_path = Path(tmp.name)
+
+    class Entry(Model):
+        __tablename__ = "tx_entries"
+        id   = Field("INTEGER", primary_key=True)
+        name = Field("TEXT")
+        qty  = Field("INTEGER", default=0)
+
+    db = Database(db_path)
+    await Entry.create_table(db)
+    await Entry.insert(db, name="a", qty=1)
+
+    # Success path: update + insert + delete commit together
+    async with db.transaction():
+        await Entry.update(db, where={"name": "a"}, fields={"qty": 2})
+        await Entry.insert(db, name="b", qty=5)
+        await Entry.delete(db, where={"name": "b"})
+    rows = await Entry.find(db, order_by="id")
+    assert [(r["name"], r["qty"]) for r in rows] == [("a", 2)]
+
+    # The commit is visible from an independent connection
+    other = Database(db_path)
+    assert [r["qty"] for r in await Entry.find(other, where={"name": "a"})] == [2]
+    await other.close()
+
+    # Failure path: everything inside the block is rolled back
+    try:
+        async with db.transaction():
+            await Entry.update(db, where={"name": "a"}, fields={"qty": 99})
+            await Entry.insert(db, name="c")
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    rows = await Entry.find(db, order_by="id")
+    assert [(r["name"], r["qty"]) for r in rows] == [("a", 2)]
+
+    # Nested blocks join the outer transaction
+    try:
+        async with db.transaction():
+            await Entry.insert(db, name="d")
+            async with db.transaction():
+                await Entry.insert(db, name="e")
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert not await Entry.exists(db, where={"name__in": ["d", "e"]})
+
+    # Writes from another task wait for the block instead of joining its rollback
+    opened = asyncio.Event()
+
+    async def failing_block():
+        async with db.transaction():
+            await Entry.insert(db, name="g")
+            opened.set()
+            await asyncio.sleep(0.05)
+            raise RuntimeError("boom")
+
+    async def other_writer():
+        await opened.wait()
+        await Entry.insert(db, name="h")
+
+    results = await asyncio.gather(failing_block(), other_writer(), return_exceptions=True)
+    assert isinstance(results[0], RuntimeError) and results[1] is None
+    assert not await Entry.exists(db, where={"name": "g"})
+    assert await Entry.exists(db, where={"name": "h"})
+
+    # A write started while the block is still opening does not join it either
+    async def failing_at_once():
+        async with db.transaction():
+            raise RuntimeError("rollback")
+
+    results = await asyncio.gather(
+        failing_at_once(), Entry.insert(db, name="k"), return_exceptions=True
+    )
+    assert isinstance(results[0], RuntimeError) and isinstance(results[1], int)
+    assert await Entry.exists(db, where={"name": "k"})
+
+    # Concurrent blocks run one after the other
+    async def block(name):
+        async with db.transaction():
+            await Entry.insert(db, name=name)
+            await asyncio.sleep(0.01)
+            async with db.transaction():
+                await Entry.update(db, where={"name": name}, fields={"qty": 7})
+
+    await asyncio.gather(block("i"), block("j"))
+    rows = await Entry.find(db, where={"name__in": ["i", "j"]})
+    assert sorted((r["name"], r["qty"]) for r in rows) == [("i", 7), ("j", 7)]
+
+    # abandon_transaction() refuses while the owner can still finish its block...
+    async def idle_block(entered, release):
+        async with db.transaction():
+            await Entry.insert(db, name="l")
+            entered.set()
+            await release.wait()
+
+    entered, release = asyncio.Event(), asyncio.Event()
+    owner = asyncio.create_task(idle_block(entered, release))
+    await entered.wait()
+    try:
+        await db.abandon_transaction()
+        assert False, "Should have raised RuntimeError for a live owner"
+    except RuntimeError:
+        pass
+    release.set()
+    await owner
+
+    # ...and rolls back a block whose event loop was closed mid-block
+    dead_loop = asyncio.new_event_loop()
+    stuck = []
+
+    def open_on_dead_loop():
+        entered = asyncio.Event()
+        stuck.append(dead_loop.create_task(idle_block(entered, asyncio.Event())))
+        dead_loop.run_until_complete(entered.wait())
+        dead_loop.close()
+
+    await asyncio.to_thread(open_on_dead_loop)
+    await db.abandon_transaction()
+    async with db.transaction():
+        await Entry.insert(db, name="m")
+        # The stranded block unwinding late must not touch the one now open
+        stuck[0].get_coro().close()
+    assert await Entry.exists(db, where={"name": "m"})
+    assert [r["name"] for r in await Entry.find(db, where={"name": "l"})] == ["l"]
+
+    # Normal per-call commits resume after the block
+    await Entry.insert(db, name="f")
+    other = Database(db_path)
+    assert await Entry.exists(other, where={"name": "f"})
+    await other.close()
+
+    await db.close()
+    db_path.unlink()
+    print("✅ Transaction test passed!")
+
+
+async def test_bulk_update():
+    """Test applying many (where, fields) updates in one call"""
+    print("🧪 Testing bulk_update...")
+
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        db_path = Path(tmp.name)
+
+    class Peer(Model):
+        __tablename__ = "bulk_peers"
+        id         = Field("INTEGER", primary_key=True)
+        peer_id    = Field("TEXT")
+        state      = Field("TEXT")
+        retries    = Field("INTEGER", default=0)
+        updated_at = Field("DATETIME", on_update=True)
+
+    db = Database(db_path)
+    await Peer.create_table(db)
+    for pid in ("p1", "p2", "p3"):
+        await Peer.insert(db, peer_id=pid, state="ready")
+
+    # Two different field shapes in one batch
+    await Peer.bulk_update(db, [
+        ({"peer_id": "p1"}, {"state": "busy", "retries": 1}),
+        ({"peer_id": "p2"}, {"retries": 7}),
+        ({"peer_id": "p3"}, {"state": "done", "retries": 2}),
+    ])
+    rows = await Peer.find(db, order_by="peer_id")
+    assert [(r["peer_id"], r["state"], r["retries"]) for r in rows] == [
+        ("p1", "busy", 1), ("p2", "ready", 7), ("p3", "done", 2)
+    ]
+    assert all(r["updated_at"] is not None for r in rows)
+
+    # bulk_update shares cached statements with update()
+    assert len([k for k in db._stmt_cache if k[0] == "update"]) == 2
+
+    # Empty batch is a no-op
+    await Peer.bulk_update(db, [])
+
+    await db.close()
+    db_path.unlink()
+    print("✅ bulk_update test passed!")
+
+
+async def test_insert_many():
+    """Test inserting many rows in one call"""
+    print("🧪 Testing insert_many...")
+
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        db_path = Path(tmp.name)
+
+    class Event(Model):
+        __tablename__ = "bulk_events"
+        id    = Field("INTEGER", primary_key=True)
+        peer  = Field("TEXT")
+        nonce = Field("TEXT")
+        flow  = Field("TEXT", default="sent")
+
+    db = Database(db_path)
+    await Event.create_table(db)
+
+    await Event.insert_many(db, [
+        {"peer": "p1", "nonce": "111"},
+        {"peer": "p2", "nonce": "222"},
+        {"peer": "p1", "nonce": "333", "flow": "received"},
+    ])
+    rows = await Event.find(db, order_by="id")
+    assert [(r["peer"], r["nonce"], r["flow"]) for r in rows] == [
+        ("p1", "111", "sent"), ("p2", "222", "sent"), ("p1", "333", "received")
+    ]
+
+    # Empty batch is a no-op
+    await Event.insert_many(db, [])
+    assert len(await Event.find(db)) == 3
+
+    # Unknown fields are rejected before anything is written
+    try:
+        await Event.insert_many(db, [{"peer": "p3", "nonce": "444"}, {"bogus": 1}])
+        assert False, "Should have raised ValueError for unknown field"
+    except ValueError as e:
+        assert "Unknown fields for Event" in str(e)
+    assert len(await Event.find(db)) == 3
+
+    await db.close()
+    db_path.unlink()
+    print("✅ insert_many test passed!")
+
+
+async def test_pragmas():
+    """Test connection PRAGMAs passed to Database"""
+    print("🧪 Testing pragmas...")
+
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        db_path = Path(tmp.name)
+
+    db = Database(db_path, pragmas={"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 5000})
+    assert (await db.fetchone("PRAGMA journal_mode"))[0] == "wal"
+    assert (await db.fetchone("PRAGMA synchronous"))[0] == 1   # NORMAL
+    assert (await db.fetchone("PRAGMA busy_timeout"))[0] == 5000
+
+    # Re-applied when the connection is reopened
+    await db.close()
+    assert (await db.fetchone("PRAGMA busy_timeout"))[0] == 5000
+
+    await db.close()
+    for suffix in ("", "-wal", "-shm"):
+        Path(str(db_path) + suffix).unlink(missing_ok=True)
+    print("✅ pragmas test passed!")
+
+
 async def main():
     """Run all tests"""
     print("🚀 Running README snippet tests...\n")
@@ -469,6 +781,11 @@ async def main():
         await test_indexes()
         await test_error_handling()
         await test_exists()
+        await test_statement_cache()
+        await test_transaction()
+        await test_bulk_update()
+        await test_insert_many()
+        await test_pragmas()
         
         print("\n🎉 All README snippets work correctly!")
         